@@ -4,6 +4,9 @@
 # ~
 
 import os
+import time
+
+STARTED = time.perf_counter()
 
 try:
     import ujson as json
@@ -0,0 +1,349 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/08
+# ~
+
+"""
+Cliente `asyncio` para el `registry`, expone la misma interfaz que
+`aysa.registry.Api` y permite mantener miles de operaciones en vuelo desde
+un único hilo, compartiendo las conexiones de la sesión.
+
+Requiere `aiohttp`: `pip install aysa-docker[async]`.
+"""
+
+import re
+import time
+import asyncio
+from urllib.parse import urlparse, parse_qs
+from aysa import codec
+from aysa.metrics import metrics, get_endpoint
+from aysa.registry import Catalog, Tags, SlimManifest, Blob, Manifest, \
+    RegistryError, CircuitOpenError, CircuitBreaker, TokenCache, backoff, \
+    check_response, get_media_type, get_rate_limiter, get_retry_after, \
+    get_token_scope, is_failure, parse_challenge, scheme, to_bool, \
+    to_float, to_int, JOBS, PAGE_SIZE, POOL_SIZE, TIMEOUT, USER_AGENT, \
+    RETRIES, BACKOFF, RETRY_STATUS, IDEMPOTENT_METHODS
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+CONCURRENCY = 100
+DIGEST_HEADER = 'Docker-Content-Digest'
+
+rx_link = re.compile(r'<([^>]+)>\s*;\s*rel="?next"?', re.I)
+
+
+def get_next_last(headers):
+    r = rx_link.search(headers.get('Link', ''))
+    if r is None:
+        return None
+    last = parse_qs(urlparse(r.group(1)).query).get('last', None)
+    return last[0] if last else None
+
+
+class AsyncResponse:
+    def __init__(self, status_code, reason, headers, content):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return codec.loads(self.content)
+
+
+class AsyncRegistry:
+    def __init__(self, host, insecure=False, verify=True, credentials=None,
+                 pool_size=POOL_SIZE, keep_alive=True, timeout=TIMEOUT,
+                 concurrency=CONCURRENCY, retries=RETRIES, backoff=BACKOFF,
+                 breaker=True, max_rps=None, max_inflight=None,
+                 max_write_rps=None, max_write_inflight=None, **kwargs):
+        if aiohttp is None:
+            raise RegistryError('El cliente asíncrono requiere el paquete '
+                                '`aiohttp`.')
+        self.host = host
+        self.insecure = insecure
+        self.verify = verify if insecure is False else True
+        self.scheme = scheme(host) if insecure is False else 'http'
+        self.credentials = credentials
+        self.pool_size = max(1, to_int(pool_size, POOL_SIZE))
+        self.keep_alive = to_bool(keep_alive, True)
+        self.timeout = to_int(timeout, TIMEOUT)
+        self.concurrency = max(1, to_int(concurrency, CONCURRENCY))
+        self.retries = max(0, to_int(retries, RETRIES))
+        self.backoff = to_float(backoff, BACKOFF)
+        self.breaker = CircuitBreaker() if to_bool(breaker, True) else None
+        self.limiter = get_rate_limiter(host, max_rps, max_inflight,
+                                        max_write_rps, max_write_inflight)
+        self.retried = 0
+        self.tokens = TokenCache()
+        self._session = None
+        self._semaphore = None
+        self._token_locks = {}
+
+    def get_baseurl(self):
+        return '{}://{}/v2'.format(self.scheme, self.host)
+
+    def get_credentials(self):
+        if self.credentials is None:
+            return None
+        return aiohttp.BasicAuth(*self.credentials.split(':', 1))
+
+    @property
+    def client(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                force_close=not self.keep_alive,
+                ssl=None if to_bool(self.verify, True) else False)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'User-Agent': USER_AGENT},
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, method, url, params=None, headers=None,
+                      data=None, strict=True):
+        if not metrics.enabled:
+            return await self._retry(method, url, params, headers, data,
+                                     strict)
+        started = time.perf_counter()
+        status, received = 'error', 0
+        try:
+            response = await self._retry(method, url, params, headers, data,
+                                         False)
+            status, received = response.status_code, len(response.content)
+        finally:
+            metrics.record(method, get_endpoint(url), status,
+                           time.perf_counter() - started,
+                           len(data) if isinstance(data, bytes) else 0,
+                           received)
+        return check_response(response) if strict is True else response
+
+    def _record(self, success, generation):
+        if self.breaker is not None:
+            self.breaker.record(success, generation)
+
+    async def _retry(self, method, url, params=None, headers=None, data=None,
+                     strict=True):
+        retries = self.retries if method in IDEMPOTENT_METHODS else 0
+        attempt = 0
+        while 1:
+            generation = self.breaker.allow() if self.breaker is not None \
+                else True
+            if not generation:
+                raise CircuitOpenError(self.host)
+            retry_after = None
+            try:
+                response = await self._request(method, url, params,
+                                               headers, data)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                self._record(False, generation)
+                if attempt >= retries:
+                    raise
+            except Exception:
+                self._record(False, generation)
+                raise
+            except BaseException:
+                self._record(None, generation)
+                raise
+            else:
+                self._record(not is_failure(response.status_code),
+                             generation)
+                if attempt >= retries \
+                        or response.status_code not in RETRY_STATUS:
+                    break
+                retry_after = get_retry_after(response)
+            await asyncio.sleep(backoff(attempt, self.backoff,
+                                        retry_after=retry_after))
+            attempt += 1
+            self.retried += 1
+        return check_response(response) if strict is True else response
+
+    async def _request(self, method, url, params=None, headers=None,
+                       data=None):
+        headers = dict(headers or {})
+        session = self.client
+        async with self._semaphore:
+            await self.limiter.acquire_async(method)
+            try:
+                return await self._authorize(session, method, url, params,
+                                             headers, data)
+            finally:
+                self.limiter.release(method)
+
+    async def _authorize(self, session, method, url, params, headers, data):
+        scope = get_token_scope(method, url)
+        token = self.tokens.get(scope)
+        auth = None
+        if token is not None:
+            headers['Authorization'] = 'Bearer ' + token
+        else:
+            auth = self.get_credentials()
+        response = await self._send(session, method, url, params,
+                                    headers, data, auth)
+        if response.status_code == 401:
+            challenge = response.headers.get('WWW-Authenticate', None)
+            scheme_, params_ = parse_challenge(challenge)
+            if scheme_ == 'bearer' and 'realm' in params_:
+                token = await self.token(scope, params_)
+                headers['Authorization'] = 'Bearer ' + token
+                response = await self._send(session, method, url,
+                                            params, headers, data)
+        return response
+
+    async def _send(self, session, method, url, params, headers, data,
+                    auth=None):
+        async with session.request(method, url, params=params,
+                                   headers=headers, data=data,
+                                   auth=auth) as r:
+            content = await r.read()
+            return AsyncResponse(r.status, r.reason, r.headers, content)
+
+    async def token(self, scope, challenge):
+        lock = self._token_locks.setdefault(scope, asyncio.Lock())
+        async with lock:
+            token = self.tokens.get(scope)
+            if token is not None:
+                return token
+            params = {'scope': challenge.get('scope', scope)}
+            if 'service' in challenge:
+                params['service'] = challenge['service']
+            async with self.client.get(challenge['realm'], params=params,
+                                       auth=self.get_credentials()) as r:
+                if r.status >= 400:
+                    raise RegistryError('No se pudo obtener el token para '
+                                        '"{}": {} {}'.format(scope, r.status,
+                                                             r.reason))
+                data = codec.loads(await r.read())
+            token = data.get('token', None) or data.get('access_token', None)
+            if not token:
+                raise RegistryError('La respuesta del servidor de tokens no '
+                                    'contiene un token.')
+            self.tokens.set(scope, token, data.get('expires_in', None))
+            return token
+
+
+class AsyncApi:
+    def __init__(self, host, insecure=False, verify=True, credentials=None,
+                 page_size=PAGE_SIZE, **kwargs):
+        self.registry = AsyncRegistry(host, insecure, verify, credentials,
+                                      **kwargs)
+        self.page_size = page_size
+
+    async def close(self):
+        await self.registry.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _pages(self, url, response_key, page_size=None, last=None):
+        url = self.registry.get_baseurl() + url
+        n = max(1, to_int(page_size or self.page_size, PAGE_SIZE))
+        while 1:
+            params = {'n': n}
+            if last is not None:
+                params['last'] = last
+            r = await self.registry.request('GET', url, params=params)
+            response_data = r.json()
+            if response_key not in response_data:
+                raise RegistryError('La clave "{}" no se encuentra dentro de '
+                                    'la respuesta.'.format(response_key))
+            yield response_data[response_key] or []
+            last = get_next_last(r.headers)
+            if last is None:
+                break
+
+    async def catalog(self, prefix_filter=None, page_size=None):
+        seek = Catalog(None, prefix_filter).seek()
+        async for page in self._pages(Catalog.url, Catalog.response_key,
+                                      page_size, seek):
+            for item in page:
+                if prefix_filter and not item.startswith(prefix_filter):
+                    if item > prefix_filter:
+                        return
+                    continue
+                yield item
+
+    async def tags(self, name, prefix_filter=None, page_size=None):
+        url = Tags.url_template.format(name=name)
+        async for page in self._pages(url, Tags.response_key, page_size):
+            for item in page:
+                if prefix_filter and not item.startswith(prefix_filter):
+                    continue
+                yield item
+
+    async def put_tag(self, name, reference, target):
+        r = await self.get_manifest(name, reference)
+        return await self.put_manifest(name, target, r.content,
+                                       r.headers.get('Content-Type', None))
+
+    async def delete_tag(self, name, reference, digest=None):
+        digest = digest or await self.digest(name, reference)
+        if digest is None:
+            raise RegistryError('La imagen "{}:{}" no existe.'
+                                .format(name, reference))
+        return await self.del_manifest(name, digest)
+
+    async def digest(self, name, reference, fat=False, **kwargs):
+        r = await self._manifest('HEAD', name, reference, fat, strict=False)
+        if r.status_code == 404:
+            return None
+        if not r.ok:
+            raise RegistryError('{}: {}'.format(r.status_code, r.reason))
+        return r.headers.get(DIGEST_HEADER, None)
+
+    async def digests(self, pairs, jobs=JOBS, **kwargs):
+        pairs = list(pairs)
+        values = await asyncio.gather(*[self.digest(*x) for x in pairs])
+        return dict(zip(pairs, values))
+
+    async def manifest(self, name, reference, fat=False, obj=False, **kwargs):
+        r = await self.get_manifest(name, reference, fat)
+        raw = r.json()
+        digest = r.headers.get(DIGEST_HEADER, None)
+        return Manifest(raw, digest) if obj is True else raw
+
+    async def blob(self, name, digest, **kwargs):
+        url = self.registry.get_baseurl() \
+            + Blob.url_template.format(name=name, digest=digest)
+        return await self.registry.request('GET', url)
+
+    async def get_manifest(self, name, reference, fat=False, **kwargs):
+        return await self._manifest('GET', name, reference, fat)
+
+    async def put_manifest(self, name, reference, manifest, content_type=None,
+                           **kwargs):
+        if not isinstance(manifest, bytes):
+            manifest = codec.dumpb(manifest)
+        return await self._manifest('PUT', name, reference, data=manifest,
+                                    content_type=content_type)
+
+    async def del_manifest(self, name, reference, **kwargs):
+        return await self._manifest('DELETE', name, reference)
+
+    async def _manifest(self, method, name, reference, fat=False, data=None,
+                        strict=True, content_type=None):
+        url = self.registry.get_baseurl() \
+            + SlimManifest.url_template.format(name=name, reference=reference)
+        media_type = get_media_type('v2f' if fat is True else 'v2', obj=False)
+        headers = {'Accept': '*/*',
+                   'Content-Type': content_type or media_type} \
+            if method in ('PUT', 'DELETE') else {'Accept': media_type}
+        return await self.registry.request(method, url, headers=headers,
+                                           data=data, strict=strict)
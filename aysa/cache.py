@@ -0,0 +1,332 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/04
+# ~
+
+"""
+Cache en disco para las consultas `GET` al `registry`.
+
+Cada respuesta se almacena junto a sus headers (`ETag`, `Link`,
+`Docker-Content-Digest`, etc.) y es revalidada mediante `If-None-Match`
+una vez vencido el `ttl`. Las entradas se agrupan por repositorio para
+poder invalidarlas luego de una escritura (`PUT` o `DELETE`).
+
+Los manifiestos y blobs de configuración se guardan por separado en un
+almacén direccionado por contenido (`sha256`), el cual nunca vence.
+"""
+
+import os
+import re
+import time
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlencode, urlparse
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from aysa import codec
+
+CACHE_PATH = '~/.aysa/cache'
+CACHE_TTL = 300
+CACHE_SIZE = 64
+CACHE_HEADERS = ('Content-Type', 'Docker-Content-Digest', 'ETag', 'Link')
+STORE_SIZE = 1024
+SHA256 = 'sha256:'
+MEGABYTE = 1024 * 1024
+
+rx_scope = re.compile(r'^/v2/(.+?)/(?:manifests|tags|blobs)/')
+
+
+def get_scope(url):
+    path = urlparse(url).path
+    r = rx_scope.match(path)
+    return r.group(1) if r is not None else path.strip('/')
+
+
+def get_hash(value):
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+
+def is_digest(value):
+    return isinstance(value, str) and value.startswith(SHA256) \
+        and len(value) == len(SHA256) + 64
+
+
+def build_response(meta, body):
+    response = Response()
+    response.status_code = meta['status']
+    response.reason = meta.get('reason', None)
+    response.headers = CaseInsensitiveDict(meta['headers'])
+    response.url = meta['url']
+    response.encoding = 'utf-8'
+    response._content = body
+    return response
+
+
+class HttpCache:
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_size=CACHE_SIZE,
+                 refresh=False):
+        self.path = Path(path or CACHE_PATH).expanduser() / 'http'
+        self.ttl = ttl
+        self.max_size = max_size * MEGABYTE
+        self.refresh = refresh
+        self._size = None
+        self._lock = threading.Lock()
+
+    def key(self, url, params=None, headers=None):
+        query = urlencode(sorted((params or {}).items()))
+        accept = (headers or {}).get('Accept', '')
+        return get_scope(url), '{}?{}#{}'.format(url, query, accept)
+
+    def _files(self, key):
+        scope, value = key
+        folder = self.path / get_hash(scope)
+        name = get_hash(value)
+        return folder / (name + '.json'), folder / (name + '.body')
+
+    def get(self, key):
+        meta_file, body_file = self._files(key)
+        try:
+            meta = codec.loads(meta_file.read_bytes())
+            body = body_file.read_bytes()
+            os.utime(str(body_file), None)
+        except (OSError, ValueError):
+            return None
+        return meta, body
+
+    def set(self, key, response):
+        meta_file, body_file = self._files(key)
+        meta = {
+            'url': response.url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'stored': time.time(),
+            'headers': {k: response.headers[k] for k in CACHE_HEADERS
+                        if k in response.headers}
+        }
+        body = response.content
+        meta = codec.dumpb(meta)
+        previous = self._size_of(meta_file, body_file)
+        try:
+            meta_file.parent.mkdir(parents=True, exist_ok=True)
+            self._write(body_file, body)
+            self._write(meta_file, meta)
+        except OSError:
+            return
+        self._grow(len(body) + len(meta) - previous)
+
+    def touch(self, key):
+        meta_file, body_file = self._files(key)
+        try:
+            meta = codec.loads(meta_file.read_bytes())
+            meta['stored'] = time.time()
+            self._write(meta_file, codec.dumpb(meta))
+            os.utime(str(body_file), None)
+        except (OSError, ValueError):
+            pass
+
+    def invalidate(self, url):
+        shutil.rmtree(str(self.path / get_hash(get_scope(url))),
+                      ignore_errors=True)
+
+    def is_fresh(self, meta):
+        if self.refresh is True:
+            return False
+        return time.time() - meta.get('stored', 0) < self.ttl
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(str(self.path), ignore_errors=True)
+            self._size = 0
+
+    def _write(self, filepath, data):
+        tmp = filepath.with_name('{}.{}.{}'.format(
+            filepath.name, os.getpid(), threading.get_ident()))
+        tmp.write_bytes(data)
+        os.replace(str(tmp), str(filepath))
+
+    @staticmethod
+    def _size_of(*files):
+        size = 0
+        for x in files:
+            try:
+                size += x.stat().st_size
+            except OSError:
+                continue
+        return size
+
+    def _entries(self):
+        """
+        Retorna las entradas `(último acceso, tamaño, body, meta)`, el
+        acceso corresponde al `body` (`get` y `touch` lo actualizan) y el
+        tamaño incluye ambos archivos.
+        """
+        if not self.path.exists():
+            return []
+        entries = []
+        for x in self.path.glob('*/*.body'):
+            meta_file = x.with_suffix('.json')
+            try:
+                stat = x.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime,
+                            stat.st_size + self._size_of(meta_file),
+                            x, meta_file))
+        return entries
+
+    def _grow(self, size):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(x[1] for x in self._entries())
+            else:
+                self._size += size
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        # LRU: las entradas son ordenadas por la fecha del último acceso.
+        entries = sorted(self._entries(), key=lambda x: x[0])
+        limit = self.max_size * 0.9
+        size = sum(x[1] for x in entries)
+        for _, length, body_file, meta_file in entries:
+            if size <= limit:
+                break
+            try:
+                meta_file.unlink()
+                body_file.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            size -= length
+        self._size = size
+
+
+class BlobStore:
+    """
+    Almacén de manifiestos y blobs direccionado por `digest`, mantiene los
+    últimos `max_items` en memoria y opcionalmente persiste en disco.
+    También recuerda el último `digest` conocido de cada `tag`
+    (`get_ref`/`set_ref`), sólo como indicio: el `tag` se debe validar
+    contra el `registry`.
+    """
+    def __init__(self, path=None, max_items=STORE_SIZE):
+        self.path = Path(path).expanduser() / 'sha256' \
+            if path is not None else None
+        self.refs_path = self.path.parent / 'refs' \
+            if self.path is not None else None
+        self.max_items = max(1, max_items)
+        self._data = OrderedDict()
+        self._refs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def has(self, digest):
+        if not is_digest(digest):
+            return False
+        with self._lock:
+            if digest in self._data:
+                return True
+        return self.path is not None \
+            and self._files(digest)[0].exists()
+
+    def get_ref(self, name, reference):
+        key = '{}:{}'.format(name, reference)
+        with self._lock:
+            value = self._refs.get(key, None)
+        if value is not None or self.refs_path is None:
+            return value
+        try:
+            value = (self.refs_path / get_hash(key)).read_text('utf-8')
+        except OSError:
+            return None
+        return value if is_digest(value) else None
+
+    def set_ref(self, name, reference, digest):
+        if not is_digest(digest) or is_digest(reference):
+            return
+        key = '{}:{}'.format(name, reference)
+        with self._lock:
+            if self._refs.get(key, None) == digest:
+                return
+            self._refs[key] = digest
+            self._refs.move_to_end(key)
+            while len(self._refs) > self.max_items:
+                self._refs.popitem(last=False)
+        if self.refs_path is None:
+            return
+        filepath = self.refs_path / get_hash(key)
+        tmp = filepath.with_name('{}.{}.{}'.format(
+            filepath.name, os.getpid(), threading.get_ident()))
+        try:
+            self.refs_path.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(digest, 'utf-8')
+            os.replace(str(tmp), str(filepath))
+        except OSError:
+            pass
+
+    def get(self, digest):
+        if not is_digest(digest):
+            return None
+        with self._lock:
+            value = self._data.get(digest, None)
+            if value is not None:
+                self._data.move_to_end(digest)
+                return value
+        value = self._read(digest)
+        if value is not None:
+            self._remember(digest, value)
+        return value
+
+    def set(self, digest, content, content_type=None):
+        if not is_digest(digest) or \
+                hashlib.sha256(content).hexdigest() != digest[len(SHA256):]:
+            return False
+        value = (content_type, content)
+        self._remember(digest, value)
+        self._persist(digest, value)
+        return True
+
+    def _remember(self, digest, value):
+        with self._lock:
+            self._data[digest] = value
+            self._data.move_to_end(digest)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def _files(self, digest):
+        name = digest[len(SHA256):]
+        return self.path / name, self.path / (name + '.type')
+
+    def _read(self, digest):
+        if self.path is None:
+            return None
+        content_file, type_file = self._files(digest)
+        try:
+            content = content_file.read_bytes()
+            content_type = type_file.read_text(encoding='utf-8') or None
+        except OSError:
+            return None
+        return content_type, content
+
+    def _persist(self, digest, value):
+        if self.path is None:
+            return
+        content_file, type_file = self._files(digest)
+        if content_file.exists():
+            return
+        content_type, content = value
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            for filepath, data in ((type_file, content_type or ''),
+                                   (content_file, content)):
+                if isinstance(data, str):
+                    data = data.encode('utf-8')
+                tmp = filepath.with_name('{}.{}.{}'.format(
+                    filepath.name, os.getpid(), threading.get_ident()))
+                tmp.write_bytes(data)
+                os.replace(str(tmp), str(filepath))
+        except OSError:
+            pass
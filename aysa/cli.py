@@ -4,12 +4,12 @@
 # ~
 
 import sys
+import time
 import logging
-from aysa import __version__
-from aysa.commands import Command, UpgradeCommand
-from aysa.commands.config import ConfigCommand
-from aysa.commands.registry import RegistryCommand, ReleaseCommand
-from aysa.commands.remote import RemoteCommand
+from aysa import __version__, STARTED
+from aysa.commands import Command, Printer
+from aysa.metrics import metrics
+from aysa.profiler import Profiler, phases
 
 
 # cli logger
@@ -35,10 +35,22 @@ class TopLevelCommand(Command):
                                                 de no ser definido: `~/.aysa/config.ini`.
         -X url, --proxy=url                     Configuración del `proxy` en una sola línea:
                                                 `<protocol>://<username>:<password>@<host>:<port>`
+        --no-cache                              Desactiva la `cache` de las consultas al `registry`.
+        --refresh                               Revalida todas las entradas de la `cache` del `registry`.
+        --stats                                 Imprime las métricas de las consultas al `registry`
+                                                al finalizar (`stderr`).
+        --stats-file=filename                   Guarda las métricas de las consultas al `registry`
+                                                en formato `JSON`.
+        --profile                               Imprime el tiempo por fase y las funciones más
+                                                costosas al finalizar (`stderr`).
+        --profile-output=filename               Guarda el perfil en formato `pstats` o, si el
+                                                archivo termina en `.folded`, `collapsed-stack`.
 
     Comandos disponibles:
         config      Lista y administra los valores de la configuración del entorno de trabajo
                     definido por el archivo `~/.aysa/config.ini`
+        daemon      Inicia, detiene y consulta el proceso residente que mantiene
+                    las sesiones del `registry` y las conexiones `SSH`.
         registry    Lista las `imágenes` y administra los `tags` del `repositorio`.
         release     Crea las `imágenes` para los entornos de `QA/TESTING` y `PRODUCCIÓN`.
         remote      Despliega las `imágenes` en los entornos de `DESARROLLO` y `QA/TESTING`.
@@ -50,16 +62,66 @@ class TopLevelCommand(Command):
         super().__init__('aysa', options, **kwargs)
 
     commands = {
-        'config': ConfigCommand,
-        'registry': RegistryCommand,
-        'release': ReleaseCommand,
-        'remote': RemoteCommand,
-        'upg': UpgradeCommand
+        'config': 'aysa.commands.config.ConfigCommand',
+        'daemon': 'aysa.commands.daemon.DaemonCommand',
+        'registry': 'aysa.commands.registry.RegistryCommand',
+        'release': 'aysa.commands.registry.ReleaseCommand',
+        'remote': 'aysa.commands.remote.RemoteCommand',
+        'upg': 'aysa.commands.UpgradeCommand'
     }
 
+    _profiler = None
+    started = STARTED
+
+    def parse(self, argv=None, *args, **kwargs):
+        phases.enable(self.started)
+        phases.add('startup', time.perf_counter() - self.started)
+        try:
+            return super().parse(argv, *args, **kwargs)
+        finally:
+            self.report_stats()
+            self.report_profile()
+
+    def on_parse(self, *args, **kwargs):
+        metrics.enable(bool(self.options.get('--stats', False) or
+                            self.options.get('--stats-file', None)))
+        filename = self.options.get('--profile-output', None)
+        if self.options.get('--profile', False) or filename:
+            self._profiler = Profiler(filename)
+            self._profiler.start()
+
+    def report_profile(self):
+        if self._profiler is None:
+            return
+        self._profiler.stop()
+        output = Printer(sys.stderr)
+        if self._profiler.filename:
+            try:
+                self._profiler.save()
+            except OSError as e:
+                log.error('No se pudo guardar "%s": %s',
+                          self._profiler.filename, e)
+        else:
+            self._profiler.print(output)
+        phases.print(output)
+
+    def report_stats(self):
+        filename = self.options.get('--stats-file', None)
+        if filename:
+            try:
+                metrics.save(filename)
+            except OSError as e:
+                log.error('No se pudo guardar "%s": %s', filename, e)
+        if self.options.get('--stats', False):
+            metrics.print(Printer(sys.stderr))
+
 
 # dispatcher
 def main():
+    from aysa.daemon import forward
+    code = forward(sys.argv[1:])
+    if code is not None:
+        sys.exit(code)
     try:
         TopLevelCommand({'version': __version__}).parse()
     except KeyboardInterrupt:
@@ -0,0 +1,59 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/15
+# ~
+
+"""
+Codec JSON único para las respuestas del `registry`, la `cache` y la salida
+por pantalla. Utiliza `orjson` o `ujson` cuando están instalados, de lo
+contrario la librería estándar.
+"""
+
+import json as _json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+__all__ = ['BACKEND', 'loads', 'dumps', 'dumpb']
+
+if orjson is not None:
+    BACKEND = 'orjson'
+elif ujson is not None:
+    BACKEND = 'ujson'
+else:
+    BACKEND = 'json'
+
+
+def loads(value):
+    if orjson is not None:
+        return orjson.loads(value)
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8')
+    if ujson is not None:
+        return ujson.loads(value)
+    return _json.loads(value)
+
+
+def dumpb(value, indent=None):
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_INDENT_2 if indent == 2 else 0
+        return orjson.dumps(value, option=option)
+    return dumps(value, indent).encode('utf-8')
+
+
+def dumps(value, indent=None):
+    if orjson is not None and indent in (None, 2):
+        return dumpb(value, indent).decode('utf-8')
+    if ujson is not None:
+        return ujson.dumps(value, indent=indent or 0,
+                           ensure_ascii=False, escape_forward_slashes=False)
+    if indent is None:
+        return _json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    return _json.dumps(value, indent=indent, ensure_ascii=False)
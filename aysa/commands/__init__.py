@@ -4,18 +4,22 @@
 # ~
 
 import sys
-import json
 import logging
 from copy import deepcopy
 from pathlib import Path
+from importlib import import_module
 from docopt import docopt, DocoptExit
 from inspect import getdoc, isclass
 from configparser import ConfigParser, ExtendedInterpolation
+from aysa import codec
+from aysa.profiler import phases
 
 ENV_FILE = '~/.aysa/config.ini'
 CONST_COMMAND = 'COMMAND'
 CONST_ARGS = 'ARGS'
 
+_env_cache = {}
+
 
 def docopt_helper(docstring, *args, **kwargs):
     try:
@@ -25,6 +29,11 @@ def docopt_helper(docstring, *args, **kwargs):
         raise CommandExit(docstring)
 
 
+def import_string(value):
+    module, _, name = value.rpartition('.')
+    return getattr(import_module(module), name)
+
+
 def doc_helper(docstring):
     if not isinstance(docstring, str):
         docstring = getdoc(docstring)
@@ -50,6 +59,23 @@ class ConfigObject(ConfigParser):
         return AttrDict(result)
 
 
+def env_cached(filename=None):
+    """
+    Retorna el entorno (`dict`) del archivo, lo vuelve a leer sólo cuando
+    cambia su fecha de modificación.
+    """
+    filepath = Path(filename or ENV_FILE).expanduser()
+    try:
+        mtime = filepath.stat().st_mtime_ns
+    except OSError:
+        mtime = None
+    cached = _env_cache.get(filepath, None)
+    if mtime is None or cached is None or cached[0] != mtime:
+        env, _ = env_helper(filepath)
+        cached = _env_cache[filepath] = (mtime, env.to_dict())
+    return AttrDict((k, AttrDict(v)) for k, v in cached[1].items())
+
+
 def env_helper(filename=None):
     filepath = Path(filename or ENV_FILE).expanduser()
     parser = ConfigObject(interpolation=ExtendedInterpolation())
@@ -65,6 +91,9 @@ def is_yes(value):
 
 
 class Command:
+    # estado compartido por el `daemon` (`aysa.daemon.Warm`)
+    warm = None
+
     def __init__(self, command, options=None, **kwargs):
         self.command = command
         self.options = options or {}
@@ -169,12 +198,15 @@ class Command:
     def parse(self, argv=None, *args, **kwargs):
         self.logger.info('parse argv: %s, args: %s, kwargs: %s',
                          argv, args, kwargs)
-        opt, doc = docopt_helper(self, argv, *args, **self.options, **kwargs)
-        cmd = opt.pop(CONST_COMMAND)
-        arg = opt.pop(CONST_ARGS)
-        self.options.update(opt)
-        self.setup_logger()
-        self.env_load()
+        with phases.phase('config'):
+            opt, doc = docopt_helper(self, argv, *args, **self.options,
+                                     **kwargs)
+            cmd = opt.pop(CONST_COMMAND)
+            arg = opt.pop(CONST_ARGS)
+            self.options.update(opt)
+            self.setup_logger()
+            self.env_load()
+        self.on_parse()
 
         try:
             scmd = self.find_command(cmd)
@@ -197,7 +229,8 @@ class Command:
         if isinstance(command, str):
             command = self.find_command(command)
 
-        opt, doc = docopt_helper(command, argv, options_first=True)
+        with phases.phase('config'):
+            opt, doc = docopt_helper(command, argv, options_first=True)
         opt = {k.lower(): v for k, v in opt.items()}
         command(**opt, global_args=global_args)
 
@@ -206,12 +239,16 @@ class Command:
 
     def find_command(self, command):
         try:
-            return getattr(self, 'commands')[command]
+            value = getattr(self, 'commands')[command]
         except (KeyError, AttributeError):
             return getattr(self, command)
         except Exception as e:
             self.logger.debug(e)
-        raise NoSuchCommand(command)
+            raise NoSuchCommand(command)
+        if isinstance(value, str):
+            with phases.phase('startup'):
+                value = import_string(value)
+        return value
 
     def __call__(self, argv=None, *args, **kwargs):
         return self.parse(argv, *args, **kwargs)
@@ -235,7 +272,8 @@ class Command:
             if not values:
                 values = default
             message = '{} [{}]: '.format(message[:-2], str(values))
-        value = input(message).strip()
+        value = (input if self.warm is None else self.warm.input)(message)\
+            .strip()
         if default is not None and not value:
             return default
         if cast is not None:
@@ -255,8 +293,7 @@ class Command:
         return True
 
     def env_load(self):
-        env, _ = env_helper(self.env_file)
-        self.env = env.to_dict()
+        self.env = env_cached(self.env_file)
         self.logger.info('env load: %s', self.env)
 
     def env_save(self, data=None):
@@ -273,6 +310,9 @@ class Command:
     def on_init(self, *args, **kwargs):
         pass
 
+    def on_parse(self, *args, **kwargs):
+        pass
+
     def on_finish(self, *args, **kwargs):
         pass
 
@@ -364,17 +404,20 @@ class Printer:
         self.done()
 
     def write(self, *values, **kwargs):
-        value = self._parse(*values, **kwargs)
-        if value:
-            self.output.write(value)
+        with phases.phase('output'):
+            value = self._parse(*values, **kwargs)
+            if value:
+                self.output.write(value)
 
     def flush(self, *values, **kwargs):
         if values:
             self.write(*values, **kwargs)
-        self.output.flush()
+        with phases.phase('output'):
+            self.output.flush()
 
     def json(self, value, indent=2):
-        raw = json.dumps(value, indent=indent) \
-              if isinstance(value, dict) else '-'
-        self.output.write(raw + '\n')
+        with phases.phase('output'):
+            raw = codec.dumps(value, indent=indent) \
+                  if isinstance(value, dict) else '-'
+            self.output.write(raw + '\n')
         self.flush()
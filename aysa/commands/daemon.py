@@ -0,0 +1,88 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/12/04
+# ~
+
+from aysa.commands import Command
+from aysa.daemon import Daemon, DaemonError, control, get_socket_path, \
+    is_supported
+
+
+class DaemonCommand(Command):
+    """
+    Inicia, detiene y consulta el proceso residente (`daemon`) que mantiene
+    el entorno, las sesiones del `registry` y las conexiones `SSH` entre
+    las ejecuciones de la `CLI`. Mientras está activo los comandos
+    `registry`, `release` y `remote` se ejecutan en él, de lo contrario en
+    el mismo proceso (`AYSA_NO_DAEMON=1` fuerza esta última opción).
+
+    Usage:
+        daemon COMMAND [ARGS...]
+
+    Comandos disponibles:
+        start     Inicia el `daemon` en primer plano.
+        stop      Detiene el `daemon`.
+        status    Muestra el estado del `daemon`.
+    """
+
+    def on_init(self, *args, **kwargs):
+        if not is_supported():
+            raise SystemExit('El `daemon` no está soportado en esta '
+                             'plataforma.')
+
+    def start(self, **kwargs):
+        """
+        Inicia el `daemon` en primer plano, finaliza con `Ctrl+C` o
+        `aysa daemon stop`.
+
+        Usage:
+            start [options]
+
+        Opciones:
+            -s path, --socket=path      Ruta del `socket` Unix, por defecto
+                                        `$AYSA_SOCKET` o `~/.aysa/aysa.sock`.
+        """
+        daemon = Daemon(kwargs['--socket'])
+        self.output.title(daemon.path, tmpl='daemon: {}')
+        self.output.flush()
+        try:
+            daemon.serve()
+        except DaemonError as e:
+            raise SystemExit(str(e))
+        except KeyboardInterrupt:
+            pass
+
+    def stop(self, **kwargs):
+        """
+        Detiene el `daemon`.
+
+        Usage:
+            stop [options]
+
+        Opciones:
+            -s path, --socket=path      Ruta del `socket` Unix.
+        """
+        self._status(control('stop', kwargs['--socket']), kwargs['--socket'])
+
+    def status(self, **kwargs):
+        """
+        Muestra el estado del `daemon`.
+
+        Usage:
+            status [options]
+
+        Opciones:
+            -s path, --socket=path      Ruta del `socket` Unix.
+        """
+        self._status(control('status', kwargs['--socket']),
+                     kwargs['--socket'])
+
+    def _status(self, value, path=None):
+        if value is None:
+            raise SystemExit('El `daemon` no está activo: "{}".'
+                             .format(get_socket_path(path)))
+        self.output.blank()
+        for k in ('pid', 'socket', 'uptime', 'requests', 'apis',
+                  'connections', 'logins'):
+            self.output.write(k, value[k], tmpl='{} = "{}"', tab=2)
+        self.output.blank()
@@ -5,7 +5,14 @@
 
 from aysa import WILDCARD
 from aysa.commands import Command
-from aysa.registry import Api, Image
+from aysa.registry import Api, JOBS, bounded_map, parse_image, to_int
+from aysa.release import Release
+from aysa.retention import Collector, Policy
+from aysa.usage import LayerIndex, Usage, human_size
+
+
+def short_digest(value, size=12):
+    return value.split(':')[-1][:size] if value else '-'
 
 
 class _RegistryCommand(Command):
@@ -14,13 +21,35 @@ class _RegistryCommand(Command):
     @property
     def api(self):
         if self._registry_api is None:
-            self._registry_api = Api(**self.env.registry)
+            options = dict(self.env.registry)
+            if self.global_options.get('--no-cache', False):
+                options['cache'] = False
+            if self.global_options.get('--refresh', False):
+                options['cache_refresh'] = True
+            self._registry_api = Api(**options) if self.warm is None \
+                else self.warm.api(Api, **options)
         return self._registry_api
 
     @property
     def namespace(self):
         return self.env.registry.namespace
 
+    def jobs(self, value=None):
+        return to_int(value, None) \
+            or to_int(self.env.registry.get('jobs', None), JOBS)
+
+    def on_finish(self, *args, **kwargs):
+        if self._registry_api is not None:
+            stats = self._registry_api.stats()
+            self.logger.info('registry requests: %s, connections opened: %s, '
+                             'reused: %s, retries: %s, throttled: %s, '
+                             'rate limit wait: %.3fs', stats['requests'],
+                             stats['connections'], stats['reused'],
+                             stats['retries'], stats['throttled'],
+                             stats['waited'])
+            if self.warm is None:
+                self._registry_api.close()
+
     def _fix_image_name(self, value, namespace=None):
         value = value.strip()
         namespace = namespace or self.namespace
@@ -37,20 +66,25 @@ class _RegistryCommand(Command):
         values = values.split(',') if not isinstance(values, list) else values
         return [x.strip() for x in values]
 
-    def _list(self, filter_repos=None, filter_tags=None, **kwargs):
+    def _list(self, filter_repos=None, filter_tags=None, jobs=None,
+              **kwargs):
         filter_repos = self._fix_images_list(filter_repos)
         filter_tags = self._fix_tags_list(filter_tags)
-        for x in self.api.catalog():
-            if (self.namespace and not x.startswith(self.namespace)) \
-                    or (filter_repos and x not in filter_repos):
-                continue
-            if filter_tags:
-                for y in self.api.tags(x):
-                    if filter_tags != WILDCARD and y not in filter_tags:
-                        continue
-                    yield Image('{}:{}'.format(x, y))
-            else:
-                yield Image(x)
+        repositories = (x for x in self.api.catalog(self.namespace)
+                        if not filter_repos or x in filter_repos)
+        if not filter_tags:
+            for x in repositories:
+                yield parse_image(x)
+            return
+
+        def fetch(name):
+            return name, sorted(self.api.tags(name))
+
+        for x, tags in bounded_map(fetch, repositories, self.jobs(jobs)):
+            for y in tags:
+                if filter_tags != WILDCARD and y not in filter_tags:
+                    continue
+                yield parse_image('{}:{}'.format(x, y))
 
 
 class RegistryCommand(_RegistryCommand):
@@ -62,8 +96,10 @@ class RegistryCommand(_RegistryCommand):
 
     Comandos disponibles:
         ls     Lista los `tags` diponibles en el `repositorio`.
+        du     Muestra el espacio ocupado por las `imágenes` del `namespace`.
         tag    Crea un nuevo `tag` a partir de otro existente.
         rm     Elimina uno o mas `tags` existentes.
+        gc     Elimina los `tags` según una política de retención.
     """
 
     def ls(self, **kwargs):
@@ -80,23 +116,73 @@ class RegistryCommand(_RegistryCommand):
                                            anulando al modo `detail`.
             -t tags, --filter-tags=tags    Lista de `tags` separados por comas,
                                            ex: "dev,rc,latest" [default: *]
+            -j jobs, --jobs=jobs           Cantidad de consultas concurrentes
+                                           al `repositorio`.
         """
         tmpl = ' - {} = {}'
         detail = kwargs.get('--detail', False)
         manifest = kwargs.get('--manifest', False)
+        jobs = self.jobs(kwargs['--jobs'])
         env = self.env.registry
         self.output.head(env.host, env.namespace, tmpl='[REGISTRY]: {}/{}:',
                          title=False)
-        for x in self._list(kwargs['image'], kwargs['--filter-tags']):
+        images = self._list(kwargs['image'], kwargs['--filter-tags'], jobs)
+        if detail or manifest:
+            def inspect(x):
+                return x, self.api.inspect(x.repository, x.tag)
+            images = bounded_map(inspect, images, jobs, jobs * 4)
+        else:
+            images = ((x, None) for x in images)
+        for x, m in images:
             self.output.bullet(x.repository, x.tag, tmpl='{}:{}')
-            if detail or manifest:
-                m = self.api.manifest(x.repository, x.tag, True, True)
-                if detail and not manifest:
-                    self.output.write('created', m.created, tmpl=tmpl)
-                    d = self.api.digest(x.repository, x.tag)
-                    self.output.write('digest', d, tmpl=tmpl)
-                elif manifest:
-                    self.output.json(m.history)
+            if m is None:
+                continue
+            if detail and not manifest:
+                self.output.write('created', m.created, tmpl=tmpl)
+                self.output.write('digest', m.digest, tmpl=tmpl)
+            elif manifest:
+                self.output.json(m.history)
+
+    def du(self, **kwargs):
+        """
+        Muestra el espacio ocupado por las `imágenes` del `namespace`, las
+        capas compartidas se contabilizan una única vez.
+
+        Usage:
+            du [options] [IMAGE...]
+
+        Opciones:
+            -d, --detail                   Muestra el detalle por `tag`.
+            -t tags, --filter-tags=tags    Lista de `tags` separados por comas,
+                                           ex: "dev,rc,latest" [default: *]
+            -j jobs, --jobs=jobs           Cantidad de consultas concurrentes
+                                           al `repositorio`.
+        """
+        tmpl = '{}: total {}, único {}, compartido {}'
+        jobs = self.jobs(kwargs['--jobs'])
+        env = self.env.registry
+        self.output.head(env.host, env.namespace, tmpl='[REGISTRY]: {}/{}:',
+                         title=False)
+        images = self._list(kwargs['image'], kwargs['--filter-tags'], jobs)
+        path = False if self.global_options.get('--no-cache', False) \
+            else env.get('cache_path', None)
+        index = LayerIndex(path)
+        usage = Usage(self.api, jobs, index)
+        repositories, tags, total = usage.scan(images)
+        for name, x in sorted(repositories.items()):
+            self.output.bullet(name, human_size(x.total), human_size(x.unique),
+                               human_size(x.shared), tmpl=tmpl)
+            if not kwargs['--detail']:
+                continue
+            for (repo, tag), y in sorted(tags.items()):
+                if repo != name:
+                    continue
+                self.output.write(tag, human_size(y.total),
+                                  human_size(y.unique), human_size(y.shared),
+                                  tmpl=' - ' + tmpl)
+        self.output.write(human_size(total), len(usage.digests), usage.fetched,
+                          tmpl='Total: {} ({} tag(s), {} manifiesto(s) '
+                               'descargados)')
 
     def tag(self, **kwargs):
         """
@@ -105,7 +191,7 @@ class RegistryCommand(_RegistryCommand):
         Usage:
             tag SOURCE_IMAGE_TAG TARGET_TAG
         """
-        src = Image(self._fix_image_name(kwargs['source_image_tag']))
+        src = parse_image(self._fix_image_name(kwargs['source_image_tag']))
         self.api.put_tag(src.repository, src.tag, kwargs['target_tag'])
         self.logger.info('tag repository: %s, tag: %s',
                           src.repository, src.tag)
@@ -118,19 +204,80 @@ class RegistryCommand(_RegistryCommand):
             rm [options] IMAGE_TAG [IMAGE_TAG...]
 
         Opciones:
-            -y, --yes    Responde "SI" a todas las preguntas.
+            -y, --yes              Responde "SI" a todas las preguntas.
+            -j jobs, --jobs=jobs   Cantidad de consultas concurrentes
+                                   al `repositorio`.
         """
         if self.yes(**kwargs):
-            for x in kwargs['image_tag']:
-                src = Image(self._fix_image_name(x))
+            images = [parse_image(self._fix_image_name(x))
+                      for x in kwargs['image_tag']]
+            digests = self.api.digests([(x.repository, x.tag) for x in images],
+                                       self.jobs(kwargs['--jobs']))
+            for src in images:
                 try:
-                    self.api.delete_tag(src.repository, src.tag)
+                    digest = digests[(src.repository, src.tag)]
+                    self.api.delete_tag(src.repository, src.tag, digest)
                     self.logger.info('rm repository: %s, tag: %s',
                                       src.repository, src.tag)
                 except Exception as e:
                     self.logger.error('No se pudo eliminar la image "%s": %s',
                                       src.image_tag, e)
 
+    def gc(self, **kwargs):
+        """
+        Elimina los `tags` según una política de retención, los `tags` "dev",
+        "rc", "latest" y sus "-rollback" nunca se eliminan.
+
+        Usage:
+            gc [options] [IMAGE...]
+
+        Opciones:
+            -k number, --keep=number        Conserva los N `tags` más recientes
+                                            por repositorio.
+            -p pattern, --pattern=pattern   Sólo elimina los `tags` que
+                                            coincidan con el patrón,
+                                            ex: "feature-*".
+            -o days, --older-than=days      Sólo elimina los `tags` con una
+                                            antigüedad mayor a N días.
+            -n, --dry-run                   Muestra el plan sin aplicarlo.
+            -y, --yes                       Responde "SI" a todas las preguntas.
+            -j jobs, --jobs=jobs            Cantidad de consultas concurrentes
+                                            al `repositorio`.
+        """
+        policy = Policy(kwargs['--keep'], kwargs['--pattern'],
+                        kwargs['--older-than'])
+        if not policy.defined:
+            self.output.error('Es necesario definir al menos una política: '
+                              '--keep, --pattern o --older-than.')
+            return
+        jobs = self.jobs(kwargs['--jobs'])
+        env = self.env.registry
+        self.output.head(env.host, env.namespace, tmpl='[GC]: {}/{}:',
+                         title=False)
+        collector = Collector(self.api, policy, jobs, self.logger)
+        collector.plan(self._list(kwargs['image'], WILDCARD, jobs))
+        for x in collector.candidates:
+            if x.keep:
+                self.output.bullet(x.repository, x.tag, x.reason,
+                                   tmpl='{}:{} ({})', icon='=')
+            else:
+                self.output.bullet(x.repository, x.tag,
+                                   short_digest(x.digest),
+                                   tmpl='{}:{} {}', icon='-')
+        self.output.write(len(collector.removals), len(collector.candidates),
+                          len(collector.deletes),
+                          tmpl='Eliminar: {} de {} tag(s), {} manifiesto(s)')
+        if kwargs['--dry-run'] or not collector.deletes:
+            return
+        if self.yes(**kwargs):
+            collector.run()
+            for (name, digest), e in collector.errors:
+                self.output.error(name, short_digest(digest), e,
+                                  tmpl='{}@{} {}')
+            self.output.write(len(collector.deleted), collector.elapsed or 0,
+                              tmpl='Total: {} manifiesto(s) eliminados en '
+                                   '{:.3f}s')
+
 
 class ReleaseCommand(_RegistryCommand):
     """
@@ -140,25 +287,79 @@ class ReleaseCommand(_RegistryCommand):
         release COMMAND [ARGS...]
 
     Comandos disponibles:
+        plan          Muestra los cambios que realizaría el `release`.
         quality       Crea las `imágenes` para el entorno de `QA/TESTING`.
         production    Crea las `imágenes` para el entorno de `PRODUCCIÓN`.
     """
+    releases = {
+        'quality': ('dev', 'rc'),
+        'production': ('rc', 'latest')
+    }
+
+    def _plan(self, source_tag, target_tag, **kwargs):
+        jobs = self.jobs(kwargs['--jobs'])
+        images = self._list(kwargs['image'], source_tag, jobs)
+        release = Release(self.api, source_tag, target_tag, jobs,
+                          self.logger)
+        release.plan([x.repository for x in images])
+        self.output.head(source_tag, target_tag, tmpl='[PLAN]: {} -> {}',
+                         title=False)
+        for x in release.targets:
+            if x.changed:
+                self.output.bullet(x.repository, x.target,
+                                   short_digest(x.previous),
+                                   short_digest(x.digest),
+                                   tmpl='{}:{} {} -> {}', icon='+')
+            else:
+                self.output.bullet(x.repository, x.target,
+                                   tmpl='{}:{} sin cambios', icon='=')
+        self.output.write(len(release.changes), len(release.targets),
+                          tmpl='Cambios: {} de {} imagen(es)')
+        return release
 
     def _release(self, source_tag, target_tag, **kwargs):
+        release = self._plan(source_tag, target_tag, **kwargs)
+        if not release.changes:
+            return
         if self.yes(**kwargs):
-            for x in self._list(kwargs['image'], source_tag):
-                t = Image('{}:{}'.format(x.repository, target_tag))
-                try:
-                    rollback = '{}-rollback'.format(t.tag)
-                    self.api.put_tag(t.repository, t.tag, rollback)
-                    self.logger.info('release source: %s, target: %s',
-                                     t.tag, rollback)
-                except Exception as e:
-                    self.logger.error('Rollback imagen "%s": %s',
-                                      t.image_tag, e)
-                self.api.put_tag(x.repository, x.tag, t.tag)
-                self.logger.info('release source: %s, target: %s',
-                                 x.tag, t.tag)
+            try:
+                release.run()
+            finally:
+                self._report(release)
+
+    def _report(self, release):
+        tmpl = '{}:{} -> {} ({:.3f}s)'
+        for x in release.targets:
+            if x.elapsed is None:
+                continue
+            if x.error is not None:
+                self.output.error(x.repository, x.source, x.target,
+                                  x.elapsed, tmpl=tmpl + ' {}'
+                                  .format(x.error))
+            elif x.restored:
+                self.output.bullet(x.repository, x.source, x.target,
+                                   x.elapsed, tmpl=tmpl + ' restaurada')
+            else:
+                self.output.bullet(x.repository, x.source, x.target,
+                                   x.elapsed, tmpl=tmpl)
+        self.output.write(len(release.promoted), release.elapsed or 0,
+                          release.throughput,
+                          tmpl='Total: {} imagen(es) en {:.3f}s '
+                               '({:.2f} imagen(es)/s)')
+
+    def plan(self, **kwargs):
+        """
+        Muestra los cambios que realizaría el `release`, sin aplicarlos.
+
+        Usage:
+            plan [options] (quality|production) [IMAGE...]
+
+        Opciones:
+            -j jobs, --jobs=jobs   Cantidad de consultas concurrentes
+                                   al `repositorio`.
+        """
+        stage = 'quality' if kwargs['quality'] else 'production'
+        self._plan(*self.releases[stage], **kwargs)
 
     def quality(self, **kwargs):
         """
@@ -168,9 +369,11 @@ class ReleaseCommand(_RegistryCommand):
             quality [options] [IMAGE...]
 
         Opciones:
-            -y, --yes    Responde "SI" a todas las preguntas.
+            -y, --yes              Responde "SI" a todas las preguntas.
+            -j jobs, --jobs=jobs   Cantidad de consultas concurrentes
+                                   al `repositorio`.
         """
-        self._release('dev', 'rc', **kwargs)
+        self._release(*self.releases['quality'], **kwargs)
 
     def production(self, **kwargs):
         """
@@ -180,6 +383,8 @@ class ReleaseCommand(_RegistryCommand):
             production [options] [IMAGE...]
 
         Opciones:
-            -y, --yes    Responde "SI" a todas las preguntas.
+            -y, --yes              Responde "SI" a todas las preguntas.
+            -j jobs, --jobs=jobs   Cantidad de consultas concurrentes
+                                   al `repositorio`.
         """
-        self._release('rc', 'latest', **kwargs)
+        self._release(*self.releases['production'], **kwargs)
@@ -8,12 +8,18 @@
 
 import re
 from pathlib import Path
+from importlib import import_module
 from functools import lru_cache
-from fabric import Connection
 from aysa.commands import Command
+from aysa.profiler import phases
 
 DEVELOPMENT = 'development'
 QUALITY = 'quality'
+BACKEND = 'fabric'
+BACKENDS = {
+    'fabric': 'fabric:Connection',
+    'local': 'aysa.fake.remote:FakeConnection'
+}
 rx_item = re.compile(r'^[a-z](?:[\w_])+_\d{1,3}\s{2,}[a-z0-9](?:[\w.-]+)'
                      r'(?::\d{1,5})?/[a-z0-9](?:[\w.-/])*\s{2,}'
                      r'(?:[a-z][\w.-]*)\s', re.I)
@@ -21,6 +27,21 @@ rx_service = re.compile(r'^[a-z](?:[\w_])+$', re.I)
 rx_login = re.compile(r'Login\sSucceeded$', re.I)
 
 
+@lru_cache()
+def get_backend(value=None):
+    """
+    Retorna la clase de conexión para el `backend` ("fabric", "local" o la
+    ruta "modulo:Clase"), el módulo se importa recién al utilizarlo.
+    """
+    value = BACKENDS.get(value or BACKEND, value)
+    module, _, name = value.partition(':')
+    try:
+        return getattr(import_module(module), name or 'Connection')
+    except (ImportError, AttributeError) as e:
+        raise SystemExit('El `backend` de conexión "{}" no está disponible: '
+                         '{}'.format(value, e))
+
+
 class _ConnectionCommand(Command):
     _stage = None
     _stages = (DEVELOPMENT, QUALITY)
@@ -28,7 +49,8 @@ class _ConnectionCommand(Command):
 
     def s_close(self):
         if self._connection_cache is not None:
-            self._connection_cache.close()
+            if self.warm is None:
+                self._connection_cache.close()
             self._connection_cache = None
             self._stage = None
 
@@ -42,9 +64,14 @@ class _ConnectionCommand(Command):
             if env['user'].lower() == 'root':
                 raise SystemExit('El usuario "root" no está permitido para '
                                  'ejecutar despliegues.')
-            pkey = Path(env.pop('pkey', None)).expanduser()
-            env['connect_kwargs'] = {'key_filename': str(pkey)}
-            self._connection_cache = Connection(**env)
+            connection = get_backend(env.pop('backend', None))
+            pkey = env.pop('pkey', None)
+            if pkey is not None:
+                pkey = Path(pkey).expanduser()
+                env['connect_kwargs'] = {'key_filename': str(pkey)}
+            self._connection_cache = connection(**env) \
+                if self.warm is None \
+                else self.warm.connection(stage, connection, **env)
             self.logger.info('connection stage: %s, env: %s', stage, env)
             self._stage = stage
         return self._connection_cache
@@ -60,7 +87,14 @@ class _ConnectionCommand(Command):
 
     def run(self, command, hide=False, **kwargs):
         self.logger.info('run command: %s, kwargs: %s', command, kwargs)
-        return self.cnx.run(command, hide=hide, **kwargs)
+        cnx = self.cnx
+        if self.warm is not None:
+            kwargs.setdefault('in_stream', False)
+        if not cnx.is_connected:
+            with phases.phase('network'):
+                cnx.open()
+        with phases.phase('remote'):
+            return cnx.run(command, hide=hide, **kwargs)
 
     @lru_cache()
     def _norm_service(self, value, sep='_'):
@@ -114,11 +148,16 @@ class _ConnectionCommand(Command):
     def _login(self):
         try:
             env = self.env.registry
+            key = (self._stage, self.cnx.host, env.host, env.credentials)
+            if self.warm is not None and key in self.warm.logins:
+                return True
             crd = env.credentials.split(':')
             cmd = 'docker login -u {} -p {} {}'.format(*crd, env.host)
             res = rx_login.match(self.run(cmd, hide=True).stdout) is not None
             self.logger.info('login registry: %s, username: %s, status: %s',
                              env.host, crd[0], res)
+            if res and self.warm is not None:
+                self.warm.logins.add(key)
             return res
         except Exception as e:
             self.logger.error('login error: %s ', e)
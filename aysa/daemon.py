@@ -0,0 +1,448 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/12/04
+# ~
+
+"""
+Proceso residente (`aysa daemon start`) que mantiene en memoria el entorno
+(`config.ini`), las sesiones del `registry` (pool de conexiones, `tokens`,
+`cache`) y las conexiones `SSH` por entorno, de forma que las sucesivas
+invocaciones de la `CLI` no repiten el arranque, el `handshake` ni el
+`docker login`.
+
+La `CLI` se comunica con el `daemon` por un `socket` Unix
+(`~/.aysa/aysa.sock` o `$AYSA_SOCKET`), si no está disponible ejecuta el
+comando en el mismo proceso. El protocolo se compone de tramas
+`(tipo, longitud, datos)`:
+
+    A   argumentos y directorio de trabajo (`JSON`), cliente -> daemon.
+    O   salida estándar (`stdout`), daemon -> cliente.
+    E   salida de errores (`stderr`), daemon -> cliente.
+    I   solicitud de una línea de entrada (`Command.input`) y su respuesta.
+    X   código de salida, daemon -> cliente.
+
+Los comandos se ejecutan de a uno por vez (el estado de `logging`,
+`stdout`, métricas, etc., es global al proceso), las consultas de estado
+y la detención se atienden en paralelo. Si el cliente se desconecta (por
+ejemplo, `Ctrl+C`) el comando en curso se interrumpe.
+"""
+
+import io
+import os
+import sys
+import time
+import queue
+import socket
+import struct
+import logging
+import threading
+from pathlib import Path
+from socketserver import ThreadingMixIn, UnixStreamServer, \
+    StreamRequestHandler
+from aysa import codec, WIN
+
+SOCKET = '~/.aysa/aysa.sock'
+SOCKET_ENV = 'AYSA_SOCKET'
+DISABLE_ENV = 'AYSA_NO_DAEMON'
+FORWARD = ('registry', 'release', 'remote')
+WITH_VALUE = ('-E', '--env', '-O', '--debug-output', '-X', '--proxy',
+              '--stats-file', '--profile-output')
+
+REQUEST = b'A'
+OUTPUT = b'O'
+ERROR = b'E'
+INPUT = b'I'
+EXIT = b'X'
+
+HEADER = struct.Struct('>cI')
+
+# daemon logger
+log = logging.getLogger(__name__)
+
+
+def get_socket_path(value=None):
+    return Path(value or os.environ.get(SOCKET_ENV, None) or SOCKET)\
+        .expanduser()
+
+
+def is_supported():
+    return not WIN and hasattr(socket, 'AF_UNIX')
+
+
+def get_command(argv):
+    """
+    Retorna el nombre del comando (`COMMAND`) omitiendo las opciones
+    globales y sus valores.
+    """
+    skip = False
+    for x in argv:
+        if skip:
+            skip = False
+        elif x in WITH_VALUE:
+            skip = True
+        elif not x.startswith('-'):
+            return x
+    return None
+
+
+def send_frame(sock, kind, data=b''):
+    sock.sendall(HEADER.pack(kind, len(data)) + data)
+
+
+def recv_exactly(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            return None
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def recv_frame(sock):
+    header = recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None, None
+    kind, size = HEADER.unpack(header)
+    data = recv_exactly(sock, size) if size else b''
+    if data is None:
+        return None, None
+    return kind, data
+
+
+def connect(path=None):
+    """
+    Retorna un `socket` conectado al `daemon` o `None` si no está activo.
+    """
+    if not is_supported():
+        return None
+    path = get_socket_path(path)
+    if not path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+def control(action, path=None):
+    """
+    Envía una acción de control (`status`, `stop`) y retorna la respuesta,
+    o `None` si el `daemon` no está activo.
+    """
+    sock = connect(path)
+    if sock is None:
+        return None
+    with sock:
+        send_frame(sock, REQUEST, codec.dumpb({'control': action}))
+        kind, data = recv_frame(sock)
+        return codec.loads(data.decode('utf-8')) if kind == EXIT else None
+
+
+def forward(argv, path=None):
+    """
+    Ejecuta `argv` en el `daemon` y retorna el código de salida, o `None`
+    cuando el comando se debe ejecutar en el mismo proceso.
+    """
+    if os.environ.get(DISABLE_ENV, None) or get_command(argv) not in FORWARD:
+        return None
+    sock = connect(path)
+    if sock is None:
+        return None
+    with sock:
+        send_frame(sock, REQUEST, codec.dumpb({'argv': argv,
+                                               'cwd': os.getcwd()}))
+        try:
+            return relay(sock)
+        except KeyboardInterrupt:
+            log.error("Aborting.")
+            return 1
+
+
+def relay(sock):
+    while 1:
+        kind, data = recv_frame(sock)
+        if kind == OUTPUT:
+            sys.stdout.write(data.decode('utf-8'))
+            sys.stdout.flush()
+        elif kind == ERROR:
+            sys.stderr.write(data.decode('utf-8'))
+            sys.stderr.flush()
+        elif kind == INPUT:
+            send_frame(sock, INPUT, sys.stdin.readline().encode('utf-8'))
+        elif kind == EXIT:
+            return int(data)
+        else:
+            sys.stderr.write('[ERROR] Se perdió la conexión con el '
+                             'daemon.\n')
+            return 1
+
+
+class Warm:
+    """
+    Estado compartido entre las ejecuciones del `daemon`: instancias de
+    `aysa.registry.Api` por configuración, conexiones por entorno y los
+    `docker login` exitosos.
+    """
+
+    def __init__(self):
+        self.apis = {}
+        self.connections = {}
+        self.logins = set()
+        self.channel = None
+        self._lock = threading.Lock()
+
+    def input(self, message=''):
+        """
+        Solicita una línea al cliente de la ejecución en curso.
+        """
+        if self.channel is None:
+            raise EOFError()
+        sys.stdout.write(message)
+        value = self.channel.readline()
+        if not value:
+            raise EOFError()
+        return value.rstrip('\n')
+
+    @staticmethod
+    def key(*values):
+        return tuple(sorted((k, str(v)) for x in values for k, v in x.items()))
+
+    def api(self, factory, **options):
+        key = self.key(options)
+        with self._lock:
+            if key not in self.apis:
+                self.apis[key] = factory(**options)
+            return self.apis[key]
+
+    def connection(self, stage, factory, **options):
+        key = (stage, self.key(options))
+        with self._lock:
+            if key not in self.connections:
+                self.connections[key] = factory(**options)
+            return self.connections[key]
+
+    def stats(self):
+        return {'apis': len(self.apis),
+                'connections': len(self.connections),
+                'logins': len(self.logins)}
+
+    def close(self):
+        with self._lock:
+            for x in self.apis.values():
+                x.close()
+            for x in self.connections.values():
+                try:
+                    x.close()
+                except Exception as e:
+                    log.debug(e)
+            self.apis.clear()
+            self.connections.clear()
+            self.logins.clear()
+
+
+class Channel:
+    """
+    Conexión con el cliente durante la ejecución de un comando, un único
+    hilo lee el `socket`: las respuestas `I` se encolan para `readline` y
+    el cierre de la conexión invoca `on_close`.
+    """
+
+    def __init__(self, sock, on_close=None):
+        self.sock = sock
+        self.on_close = on_close
+        self.closed = threading.Event()
+        self._lines = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._receive, daemon=True)
+        self._thread.start()
+
+    def _receive(self):
+        while 1:
+            try:
+                kind, data = recv_frame(self.sock)
+            except OSError:
+                kind = None
+            if kind is None:
+                break
+            if kind == INPUT:
+                self._lines.put(data.decode('utf-8'))
+        self.closed.set()
+        self._lines.put('')
+        if self.on_close is not None:
+            self.on_close(self)
+
+    def send(self, kind, data=b''):
+        if self.closed.is_set():
+            raise BrokenPipeError('El cliente se desconectó.')
+        with self._lock:
+            send_frame(self.sock, kind, data)
+
+    def readline(self):
+        self.send(INPUT)
+        return self._lines.get()
+
+
+class FrameWriter:
+    encoding = 'utf-8'
+    errors = 'strict'
+
+    def __init__(self, channel, kind):
+        self.channel = channel
+        self.kind = kind
+
+    def write(self, value):
+        if value:
+            self.channel.send(self.kind, value.encode(self.encoding))
+        return len(value)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+class _Server(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+class _Handler(StreamRequestHandler):
+    def handle(self):
+        kind, data = recv_frame(self.request)
+        if kind != REQUEST:
+            return
+        message = codec.loads(data.decode('utf-8'))
+        action = message.get('control', None)
+        try:
+            if action is not None:
+                result = self.server.daemon.control(action)
+                send_frame(self.request, EXIT, codec.dumpb(result))
+            else:
+                channel = Channel(self.request)
+                code = self.server.daemon.execute(
+                    channel, message['argv'], message.get('cwd', None))
+                channel.send(EXIT, str(code).encode())
+        except OSError as e:
+            log.debug('client disconnected: %s', e)
+
+
+class Daemon:
+    def __init__(self, path=None):
+        self.path = get_socket_path(path)
+        self.warm = Warm()
+        self.requests = 0
+        self.started = None
+        self._lock = threading.Lock()
+        self._running = None
+        self._running_lock = threading.Lock()
+        self._server = None
+
+    def serve(self):
+        """
+        Atiende las solicitudes hasta recibir `stop` (o `Ctrl+C`).
+        """
+        from aysa.commands import Command
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if connect(self.path) is not None:
+            raise DaemonError('El daemon ya se encuentra activo: "{}".'
+                              .format(self.path))
+        if self.path.exists():
+            self.path.unlink()
+        # el `socket` se crea sólo con permisos para el usuario (0600).
+        mask = os.umask(0o177)
+        try:
+            self._server = _Server(str(self.path), _Handler)
+        finally:
+            os.umask(mask)
+        self._server.daemon = self
+        self.started = time.time()
+        Command.warm = self.warm
+        try:
+            self._server.serve_forever()
+        finally:
+            Command.warm = None
+            self._server.server_close()
+            self.warm.close()
+            if self.path.exists():
+                self.path.unlink()
+
+    def control(self, action):
+        result = dict(self.warm.stats(), pid=os.getpid(), action=action,
+                      socket=str(self.path), requests=self.requests,
+                      uptime=round(time.time() - self.started, 3))
+        if action == 'stop':
+            threading.Thread(target=self._server.shutdown).start()
+        return result
+
+    def execute(self, channel, argv, cwd=None):
+        from aysa import __version__
+        from aysa.cli import TopLevelCommand
+        started = time.perf_counter()
+        with self._lock:
+            self.requests += 1
+            root = logging.getLogger()
+            handlers = list(root.handlers)
+            streams = sys.stdout, sys.stderr, sys.stdin
+            sys.stdout = FrameWriter(channel, OUTPUT)
+            sys.stderr = FrameWriter(channel, ERROR)
+            sys.stdin = io.StringIO()
+            self.warm.channel = channel
+            channel.on_close = self.cancel
+            try:
+                with self._running_lock:
+                    self._running = channel, threading.get_ident()
+                if channel.closed.is_set():
+                    raise KeyboardInterrupt()
+                if cwd:
+                    os.chdir(cwd)
+                command = TopLevelCommand({'version': __version__})
+                command.started = started
+                command.parse(argv)
+            except SystemExit as e:
+                return self.exit_code(e)
+            except KeyboardInterrupt:
+                log.error("Aborting.")
+            except Exception as e:
+                log.error(e)
+            finally:
+                with self._running_lock:
+                    self._running = None
+                self.warm.channel = None
+                sys.stdout, sys.stderr, sys.stdin = streams
+                for x in root.handlers:
+                    if x not in handlers:
+                        x.close()
+                root.handlers[:] = handlers
+        return 1
+
+    def cancel(self, channel):
+        """
+        Interrumpe (`KeyboardInterrupt`) el comando en curso cuando el
+        cliente se desconecta, los requests en vuelo finalizan y los
+        pendientes se cancelan.
+        """
+        import ctypes
+        with self._running_lock:
+            if self._running is None or self._running[0] is not channel:
+                return
+            log.debug('client disconnected, cancel: %s', self._running[1])
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                ctypes.c_ulong(self._running[1]),
+                ctypes.py_object(KeyboardInterrupt))
+
+    @staticmethod
+    def exit_code(e):
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        sys.stderr.write('{}\n'.format(e.code))
+        return 1
+
+
+class DaemonError(Exception):
+    pass
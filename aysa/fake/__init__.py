@@ -0,0 +1,9 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/27
+# ~
+
+"""
+Servicios locales que simulan la infraestructura (`registry`, hosts
+remotos) para pruebas de carga y benchmarks sin acceso a la red.
+"""
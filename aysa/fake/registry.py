@@ -0,0 +1,356 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/27
+# ~
+
+"""
+Docker Registry v2 en memoria, servido por HTTP en `localhost` dentro del
+mismo proceso, de esta forma `aysa.registry.Api` se ejercita completo
+(sesión, pool de conexiones, autenticación, cache) sin tocar la red.
+
+Soporta el catálogo y los `tags` con paginación (`Link`), manifiestos por
+`tag` o `digest` (`GET`, `HEAD`, `PUT`, `DELETE`), blobs, latencia
+configurable, inyección de errores (`429`, `503`, ...) y, de forma
+opcional, autenticación `Bearer` con su propio `realm`.
+
+    with FakeRegistry(latency=0.002) as fake:
+        fake.populate(repositories=10, tags=100)
+        api = Api(**fake.options())
+"""
+
+import re
+import time
+import uuid
+import random
+import hashlib
+import threading
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+from aysa import codec
+from aysa.registry import MEDIA_TYPES
+
+NAMESPACE = 'dash'
+PAGE_SIZE = 100
+CREDENTIALS = 'user:pass'
+CONFIG_TYPE = 'application/vnd.docker.container.image.v1+json'
+LAYER_TYPE = 'application/vnd.docker.image.rootfs.diff.tar.gzip'
+ERRORS = {
+    400: 'UNSUPPORTED',
+    401: 'UNAUTHORIZED',
+    404: 'MANIFEST_UNKNOWN',
+    429: 'TOOMANYREQUESTS',
+    500: 'UNKNOWN',
+    503: 'UNAVAILABLE'
+}
+
+rx_manifest = re.compile(r'^/v2/(.+)/(manifests|blobs)/([^/]+)$')
+rx_tags = re.compile(r'^/v2/(.+)/tags/list$')
+
+
+def sha256(value):
+    return 'sha256:' + hashlib.sha256(value).hexdigest()
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 256
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def registry(self):
+        return self.server.registry
+
+    def send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD' and body:
+            self.wfile.write(body)
+
+    def error(self, status, message=None, headers=None):
+        body = codec.dumpb({'errors': [{
+            'code': ERRORS.get(status, 'UNKNOWN'),
+            'message': message or self.responses.get(status, ('',))[0]
+        }]})
+        headers = dict(headers or {})
+        headers['Content-Type'] = 'application/json'
+        self.send(status, body, headers)
+
+    def handle_method(self):
+        status, body, headers = self.registry.handle(
+            self.command, self.path, self.headers, self.body())
+        if status < 400:
+            self.send(status, body, headers)
+        else:
+            self.error(status, body, headers)
+
+    def body(self):
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        return self.rfile.read(length) if length else b''
+
+    do_GET = do_HEAD = do_PUT = do_DELETE = handle_method
+
+
+class FakeRegistry:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=503, retry_after=None, page_size=PAGE_SIZE,
+                 auth=False, credentials=CREDENTIALS, token_expires=300,
+                 seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.auth = auth
+        self.credentials = credentials
+        self.token_expires = token_expires
+        self.repositories = {}
+        self.blobs = {}
+        self.tokens = set()
+        self.requests = {}
+        self._random = random.Random(seed)
+        self._sorted = {}
+        self._lock = threading.RLock()
+        self._server = None
+        self._thread = None
+
+    # servidor >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
+
+    @property
+    def host(self):
+        if self._server is None:
+            return None
+        return 'localhost:{}'.format(self._server.server_address[1])
+
+    def options(self, **kwargs):
+        """
+        Argumentos para `aysa.registry.Api` (o la sección `[registry]`).
+        """
+        result = {'host': self.host, 'insecure': True,
+                  'credentials': self.credentials, 'namespace': NAMESPACE}
+        result.update(kwargs)
+        return result
+
+    def start(self, port=0):
+        self._server = _Server(('127.0.0.1', port), _Handler)
+        self._server.registry = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                         daemon=True)
+        self._thread.start()
+        return self.host
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def total_requests(self):
+        return sum(self.requests.values())
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = {}
+
+    # datos >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
+
+    def add_blob(self, content, content_type='application/octet-stream'):
+        digest = sha256(content)
+        with self._lock:
+            self.blobs[digest] = (content_type, content)
+        return digest
+
+    def add_image(self, name, tag, created=None, layers=3, shared=1):
+        """
+        Crea un manifiesto `schema 2` con su blob de configuración, las
+        primeras `shared` capas son comunes a todas las imágenes.
+        """
+        created = created or datetime.utcnow()
+        if isinstance(created, datetime):
+            created = created.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        config = codec.dumpb({
+            'architecture': 'amd64',
+            'os': 'linux',
+            'created': created,
+            'config': {'Labels': {'name': name, 'tag': tag}},
+            'rootfs': {'type': 'layers', 'diff_ids': []}
+        })
+        blobs = []
+        for index in range(layers):
+            seed = 'base-{}'.format(index) if index < shared \
+                else '{}:{}:{}'.format(name, tag, index)
+            blobs.append({'mediaType': LAYER_TYPE,
+                          'size': 1024 * (index + 1),
+                          'digest': sha256(seed.encode())})
+        manifest = codec.dumpb({
+            'schemaVersion': 2,
+            'mediaType': MEDIA_TYPES['v2'],
+            'config': {'mediaType': CONFIG_TYPE, 'size': len(config),
+                       'digest': self.add_blob(config, CONFIG_TYPE)},
+            'layers': blobs
+        }, indent=2)
+        return self.put(name, tag, manifest, MEDIA_TYPES['v2'])
+
+    def put(self, name, reference, content, content_type):
+        digest = self.add_blob(content, content_type)
+        with self._lock:
+            tags = self.repositories.setdefault(name, {})
+            if not reference.startswith('sha256:'):
+                tags[reference] = digest
+            self._sorted.pop(name, None)
+            self._sorted.pop(None, None)
+        return digest
+
+    def delete(self, name, digest):
+        with self._lock:
+            tags = self.repositories.get(name, {})
+            removed = [k for k, v in tags.items() if v == digest]
+            for k in removed:
+                del tags[k]
+            self._sorted.pop(name, None)
+        return removed
+
+    def populate(self, repositories=10, tags=10, namespace=NAMESPACE,
+                 stages=('dev', 'rc', 'latest'), layers=3):
+        """
+        Crea `repositories` repositorios con `tags` tags cada uno, los
+        primeros son `stages` (`dev`, `rc`, `latest`) y el resto
+        versiones (`v00001`, ...) con fechas de creación decrecientes.
+        """
+        now = datetime.utcnow()
+        for r in range(repositories):
+            name = '{}/service-{:06d}'.format(namespace, r)
+            for t in range(tags):
+                tag = stages[t] if t < len(stages) \
+                    else 'v{:05d}'.format(t - len(stages) + 1)
+                self.add_image(name, tag, now - timedelta(days=t), layers)
+        return repositories * tags
+
+    def resolve(self, name, reference):
+        if reference.startswith('sha256:'):
+            return reference if reference in self.blobs else None
+        return self.repositories.get(name, {}).get(reference, None)
+
+    def _keys(self, name=None):
+        with self._lock:
+            if name not in self._sorted:
+                source = self.repositories if name is None \
+                    else self.repositories.get(name, {})
+                self._sorted[name] = sorted(source)
+            return self._sorted[name]
+
+    # http >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
+
+    def handle(self, method, path, headers, body):
+        """
+        Retorna `(status, body|message, headers)`.
+        """
+        with self._lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+        url = urlparse(path)
+        if url.path == '/token':
+            return self._token(headers)
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self._random.uniform(0, self.jitter))
+        if self.error_rate and self._random.random() < self.error_rate:
+            extra = {'Retry-After': str(self.retry_after)} \
+                if self.retry_after is not None else {}
+            return self.error_status, None, extra
+        if self.auth and not self._authorized(headers):
+            return 401, None, {'WWW-Authenticate': self._challenge(headers)}
+        query = parse_qs(url.query)
+        if url.path in ('/v2', '/v2/'):
+            return 200, b'{}', {'Content-Type': 'application/json'}
+        if url.path == '/v2/_catalog':
+            return self._page(self._keys(), 'repositories', url.path, query)
+        r = rx_tags.match(url.path)
+        if r is not None:
+            name = r.group(1)
+            if name not in self.repositories:
+                return 404, 'repository name not known to registry', {}
+            return self._page(self._keys(name), 'tags', url.path, query,
+                              {'name': name})
+        r = rx_manifest.match(url.path)
+        if r is None:
+            return 404, None, {}
+        name, kind, reference = r.groups()
+        if method in ('GET', 'HEAD'):
+            return self._get(name, kind, reference, headers)
+        if method == 'PUT' and kind == 'manifests':
+            content_type = headers.get('Content-Type', MEDIA_TYPES['v2'])
+            digest = self.put(name, reference, body, content_type)
+            return 201, b'', {'Docker-Content-Digest': digest,
+                              'Location': path}
+        if method == 'DELETE' and kind == 'manifests':
+            if not reference.startswith('sha256:'):
+                return 400, 'delete by tag is not supported', {}
+            if not self.delete(name, reference):
+                return 404, 'manifest unknown', {}
+            return 202, b'', {}
+        return 405, None, {}
+
+    def _get(self, name, kind, reference, headers):
+        digest = self.resolve(name, reference)
+        if digest is None or digest not in self.blobs:
+            return 404, 'manifest unknown', {}
+        content_type, content = self.blobs[digest]
+        etag = '"{}"'.format(digest)
+        result = {'Docker-Content-Digest': digest, 'ETag': etag,
+                  'Content-Type': content_type}
+        if headers.get('If-None-Match', None) == etag:
+            return 304, b'', result
+        return 200, content, result
+
+    def _page(self, items, key, path, query, extra=None):
+        size = int(query.get('n', [self.page_size])[0])
+        last = query.get('last', [None])[0]
+        start = bisect_right(items, last) if last is not None else 0
+        page = items[start:start + size]
+        headers = {'Content-Type': 'application/json'}
+        if start + size < len(items):
+            headers['Link'] = '<{}?last={}&n={}>; rel="next"'\
+                              .format(path, page[-1], size)
+        data = {key: page}
+        data.update(extra or {})
+        return 200, codec.dumpb(data), headers
+
+    def _challenge(self, headers):
+        host = headers.get('Host', 'localhost')
+        return 'Bearer realm="http://{}/token",service="fake-registry"'\
+               .format(host)
+
+    def _authorized(self, headers):
+        value = headers.get('Authorization', '')
+        return value.startswith('Bearer ') and value[7:] in self.tokens
+
+    def _token(self, headers):
+        if not headers.get('Authorization', '').startswith('Basic '):
+            return 401, None, {}
+        token = uuid.uuid4().hex
+        with self._lock:
+            self.tokens.add(token)
+        return 200, codec.dumpb({'token': token,
+                                 'expires_in': self.token_expires}), \
+            {'Content-Type': 'application/json'}
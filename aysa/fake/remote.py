@@ -0,0 +1,139 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/29
+# ~
+
+"""
+Conexión remota simulada, reemplaza a `fabric.Connection` para ejecutar los
+comandos `remote` sin hosts reales. Responde a `docker-compose ps
+--services`, `docker-compose images`, `docker-compose ps`, `docker login`,
+etc., con una latencia configurable por conexión y por comando.
+
+Se activa por entorno en el `config.ini`:
+
+    [development]
+    backend = local
+    latency = 0.02
+    connect_latency = 0.1
+    services = 20
+"""
+
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+SERVICES = 10
+PROJECT = 'dash'
+REGISTRY = 'registry.local:5000'
+
+
+class Result:
+    def __init__(self, command, stdout='', stderr='', exited=0):
+        self.command = command
+        self.stdout = stdout
+        self.stderr = stderr
+        self.exited = exited
+
+    @property
+    def ok(self):
+        return self.exited == 0
+
+
+class Stats:
+    def __init__(self):
+        self.connects = 0
+        self.commands = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, connects=0, commands=0, size=0):
+        with self._lock:
+            self.connects += connects
+            self.commands += commands
+            self.bytes += size
+
+    @property
+    def round_trips(self):
+        return self.connects + self.commands
+
+    def clear(self):
+        with self._lock:
+            self.connects = self.commands = self.bytes = 0
+
+
+class FakeConnection:
+    stats = Stats()
+
+    def __init__(self, host, user=None, port=None, connect_kwargs=None,
+                 latency=0.0, connect_latency=0.0, services=SERVICES,
+                 tag='dev', **kwargs):
+        self.host = host
+        self.user = user
+        self.port = port
+        self.connect_kwargs = connect_kwargs or {}
+        self.latency = float(latency or 0)
+        self.connect_latency = float(connect_latency or 0)
+        self.services = ['service_{:03d}'.format(x)
+                         for x in range(int(services or SERVICES))]
+        self.tag = tag
+        self.is_connected = False
+        self._cwd = []
+
+    def open(self):
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        self.is_connected = True
+        self.stats.add(connects=1)
+
+    def close(self):
+        self.is_connected = False
+
+    @contextmanager
+    def cd(self, path):
+        self._cwd.append(path)
+        try:
+            yield
+        finally:
+            self._cwd.pop()
+
+    def run(self, command, hide=False, warn=False, **kwargs):
+        if not self.is_connected:
+            self.open()
+        if self.latency:
+            time.sleep(self.latency)
+        stdout = self.output(command.split())
+        self.stats.add(commands=1, size=len(stdout))
+        if not hide and stdout:
+            sys.stdout.write(stdout)
+        return Result(command, stdout)
+
+    def output(self, argv):
+        if argv[:1] == ['docker'] and argv[1:2] == ['login']:
+            return 'Login Succeeded\n'
+        if argv[:1] != ['docker-compose']:
+            return ''
+        if argv[1:] == ['ps', '--services']:
+            return ''.join('{}\n'.format(x) for x in self.services)
+        if argv[1:2] == ['images']:
+            return self._images()
+        if argv[1:2] == ['ps']:
+            return self._ps()
+        return ''
+
+    def _images(self):
+        lines = ['Container{}Repository{}Tag{}Image Id{}Size\n'
+                 .format(*[' ' * 4] * 4)]
+        for index, x in enumerate(self.services):
+            lines.append('{}_{}_1    {}/{}/{}    {}    {:012x}    {} MB\n'
+                         .format(PROJECT, x, REGISTRY, PROJECT,
+                                 x.replace('_', ''), self.tag, index,
+                                 100 + index))
+        return ''.join(lines)
+
+    def _ps(self):
+        lines = ['Name    Command    State    Ports\n']
+        for x in self.services:
+            lines.append('{}_{}_1    /entrypoint.sh    Up    8080/tcp\n'
+                         .format(PROJECT, x))
+        return ''.join(lines)
@@ -0,0 +1,207 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/22
+# ~
+
+"""
+Métricas de las consultas al `registry`: cantidad de requests, códigos de
+estado, bytes transferidos, reutilización de conexiones e histogramas de
+latencia (p50/p95/p99) por `endpoint`.
+
+El registro es global al proceso y sólo acumula datos cuando está activo
+(`aysa --stats` o `--stats-file`).
+"""
+
+import re
+import time
+import threading
+from bisect import bisect_left
+from urllib.parse import urlparse
+from aysa import codec
+
+BUCKETS = tuple(0.0005 * 1.25 ** x for x in range(64))
+PERCENTILES = (50, 95, 99)
+ENDPOINTS = {
+    'manifests': '/v2/{name}/manifests/{reference}',
+    'blobs': '/v2/{name}/blobs/{digest}',
+    'tags': '/v2/{name}/tags/list'
+}
+
+rx_endpoint = re.compile(r'^/v2/.+?/(manifests|blobs|tags)/[^/]+$')
+
+
+def get_endpoint(url):
+    """
+    Retorna la plantilla del `endpoint` para la `url`, de esta forma las
+    métricas se agrupan por operación y no por repositorio.
+    """
+    path = urlparse(url).path
+    r = rx_endpoint.match(path)
+    return ENDPOINTS[r.group(1)] if r is not None else path
+
+
+class Histogram:
+    """
+    Histograma de latencias con `buckets` logarítmicos (0.5ms a ~10min,
+    25% de precisión), el consumo de memoria es constante.
+    """
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, value):
+        if not self.count:
+            return 0.0
+        rank = self.count * value / 100.0
+        current = 0
+        for index, count in enumerate(self.counts):
+            current += count
+            if current >= rank:
+                break
+        bound = BUCKETS[index] if index < len(BUCKETS) else self.max
+        return min(bound, self.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self):
+        result = {'p{}'.format(x): round(self.percentile(x), 6)
+                  for x in PERCENTILES}
+        result.update(mean=round(self.mean, 6), max=round(self.max, 6))
+        return result
+
+
+class EndpointMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.cached = 0
+        self.errors = 0
+        self.statuses = {}
+        self.sent = 0
+        self.received = 0
+        self.latency = Histogram()
+
+    def add(self, status, elapsed, sent=0, received=0, cached=False):
+        self.count += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.sent += sent
+        self.received += received
+        if cached:
+            self.cached += 1
+        if status == 'error':
+            self.errors += 1
+        self.latency.add(elapsed)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'cached': self.cached,
+            'errors': self.errors,
+            'statuses': {str(k): v for k, v in sorted(
+                self.statuses.items(), key=lambda x: str(x[0]))},
+            'bytes_sent': self.sent,
+            'bytes_received': self.received,
+            'latency': self.latency.to_dict()
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.started = time.time()
+        self.endpoints = {}
+        self.connections = {'requests': 0, 'connections': 0, 'reused': 0}
+        self._lock = threading.Lock()
+
+    def enable(self, value=True):
+        self.enabled = value
+        self.started = time.time()
+        self.clear()
+
+    def record(self, method, endpoint, status, elapsed, sent=0, received=0,
+               cached=False):
+        if not self.enabled:
+            return
+        key = '{} {}'.format(method, endpoint)
+        with self._lock:
+            if key not in self.endpoints:
+                self.endpoints[key] = EndpointMetrics(key)
+            self.endpoints[key].add(status, elapsed, sent, received, cached)
+
+    def record_pool(self, stats):
+        if not self.enabled:
+            return
+        with self._lock:
+            for key in self.connections:
+                self.connections[key] += stats.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self.endpoints = {}
+            self.connections = dict.fromkeys(self.connections, 0)
+
+    def report(self):
+        with self._lock:
+            endpoints = {k: v.to_dict()
+                         for k, v in sorted(self.endpoints.items())}
+            total = Histogram()
+            for x in self.endpoints.values():
+                for index, count in enumerate(x.latency.counts):
+                    total.counts[index] += count
+                total.count += x.latency.count
+                total.total += x.latency.total
+                total.max = max(total.max, x.latency.max)
+            return {
+                'started': self.started,
+                'elapsed': round(time.time() - self.started, 6),
+                'requests': sum(x['count'] for x in endpoints.values()),
+                'errors': sum(x['errors'] for x in endpoints.values()),
+                'bytes_sent': sum(x['bytes_sent']
+                                  for x in endpoints.values()),
+                'bytes_received': sum(x['bytes_received']
+                                      for x in endpoints.values()),
+                'latency': total.to_dict(),
+                'connections': dict(self.connections),
+                'endpoints': endpoints
+            }
+
+    def save(self, filename):
+        with open(filename, 'wb') as output:
+            output.write(codec.dumpb(self.report(), indent=2))
+
+    def print(self, output):
+        data = self.report()
+        tmpl = '{:<52} {:>7} {:>9} {:>9} {:>9} {:>11}'
+        ms = '{:.1f}ms'.format
+        output.head('Registry', tmpl='[STATS]: {}', title=False)
+        output.write('endpoint', 'count', 'p50', 'p95', 'p99', 'bytes',
+                     tmpl=tmpl)
+        for name, x in data['endpoints'].items():
+            lat = x['latency']
+            output.write(name, x['count'], ms(lat['p50'] * 1000),
+                         ms(lat['p95'] * 1000), ms(lat['p99'] * 1000),
+                         x['bytes_received'] + x['bytes_sent'], tmpl=tmpl)
+            output.write(', '.join('{}={}'.format(k, v) for k, v in
+                                   x['statuses'].items()), x['cached'],
+                         tmpl='   status: {}, cache: {}')
+        lat, pool = data['latency'], data['connections']
+        output.write(data['requests'], data['errors'], data['elapsed'],
+                     tmpl='Total: {} request(s), {} error(es) en {:.3f}s')
+        output.write(ms(lat['p50'] * 1000), ms(lat['p95'] * 1000),
+                     ms(lat['p99'] * 1000), ms(lat['max'] * 1000),
+                     tmpl='Latencia: p50 {}, p95 {}, p99 {}, max {}')
+        output.write(pool['connections'], pool['reused'],
+                     tmpl='Conexiones: {} abiertas, {} reutilizadas')
+
+
+metrics = Metrics()
@@ -0,0 +1,170 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/25
+# ~
+
+"""
+Perfilado de la ejecución (`aysa --profile`).
+
+`Phases` mide el tiempo de pared por fase: `startup` (imports), `config`
+(`docopt` y `config.ini`), `network` (`registry` y conexión `SSH`),
+`remote` (comandos remotos) y `output` (salida por pantalla). Cuando una
+fase está activa en varios hilos a la vez el tiempo se cuenta una única vez.
+
+`Profiler` genera un archivo `pstats` (`cProfile`, hilo principal) o, si el
+archivo termina en `.folded` o `.collapsed`, un muestreo de todos los hilos
+en formato `collapsed-stack` (compatible con `flamegraph.pl`).
+"""
+
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+PHASES = ('startup', 'config', 'network', 'remote', 'output')
+COLLAPSED = ('.folded', '.collapsed')
+SAMPLE_INTERVAL = 0.005
+TOP_FUNCTIONS = 15
+
+
+class Phases:
+    def __init__(self):
+        self.enabled = False
+        self.started = None
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def enable(self, started=None):
+        self.enabled = True
+        self.started = started or time.perf_counter()
+        with self._lock:
+            self.totals = dict.fromkeys(PHASES, 0.0)
+            self._active = {}
+
+    def add(self, name, elapsed):
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0.0) + elapsed
+
+    def enter(self, name):
+        if not self.enabled:
+            return
+        with self._lock:
+            count, since = self._active.get(name, (0, None))
+            self._active[name] = (count + 1, since or time.perf_counter())
+
+    def leave(self, name):
+        if not self.enabled:
+            return
+        with self._lock:
+            count, since = self._active.get(name, (1, None))
+            if count > 1:
+                self._active[name] = (count - 1, since)
+                return
+            self._active.pop(name, None)
+            if since is not None:
+                self.totals[name] = self.totals.get(name, 0.0) \
+                    + time.perf_counter() - since
+
+    @contextmanager
+    def phase(self, name):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.leave(name)
+
+    def report(self):
+        total = time.perf_counter() - (self.started or time.perf_counter())
+        result = dict(self.totals)
+        result['other'] = max(0.0, total - sum(result.values()))
+        result['total'] = total
+        return result
+
+    def print(self, output):
+        data = self.report()
+        total = data['total'] or 1
+        output.head('Fases', tmpl='[PROFILE]: {}', title=False)
+        for name in PHASES + ('other', 'total'):
+            output.write(name, data[name], data[name] * 100 / total,
+                         tmpl='{:<10} {:>9.3f}s {:>6.1f}%')
+
+
+class Sampler:
+    """
+    Muestrea las pilas de todos los hilos cada `interval` segundos.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread, frame in sys._current_frames().items():
+                if thread == ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append('{} ({}:{})'.format(
+                        code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def save(self, filename):
+        with open(filename, 'w', encoding='utf-8') as output:
+            for stack, count in sorted(self.stacks.items()):
+                output.write('{} {}\n'.format(stack, count))
+
+
+class Profiler:
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.collapsed = bool(filename) and filename.endswith(COLLAPSED)
+        self._profile = None
+        self._sampler = None
+
+    def start(self):
+        if self.collapsed:
+            self._sampler = Sampler()
+            self._sampler.start()
+        else:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self._profile is not None:
+            self._profile.disable()
+
+    def save(self):
+        if self._sampler is not None:
+            self._sampler.save(self.filename)
+        elif self._profile is not None:
+            self._profile.dump_stats(self.filename)
+
+    def print(self, output, limit=TOP_FUNCTIONS):
+        if self._profile is None:
+            return
+        import pstats
+        output.head('Funciones', tmpl='[PROFILE]: {}', title=False)
+        stats = pstats.Stats(self._profile, stream=output.output)
+        stats.sort_stats('cumulative').print_stats(limit)
+
+
+phases = Phases()
@@ -5,21 +5,52 @@
 
 """
 Docker Registry Documentation: https://docs.docker.com/registry/
-
-TODO i0608156: Agregar autenticación por token.
-               https://docs.docker.com/registry/configuration/#auth
-TODO i0608156: Evaluar la implementación de un paginador para la iteración
-               del catálogo y tags.
+Token Authentication: https://docs.docker.com/registry/spec/auth/token/
 """
 
 import re
-import json
+import sys
+import time
+import uuid
+import random
+import hashlib
+import threading
 import requests
-from requests.auth import HTTPBasicAuth
+from collections import deque
+from functools import lru_cache
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase, HTTPBasicAuth, _basic_auth_str
+from aysa import codec
+from aysa.metrics import metrics, get_endpoint
+from aysa.profiler import phases
+from aysa.cache import HttpCache, BlobStore, CACHE_PATH, CACHE_TTL, \
+    CACHE_SIZE, STORE_SIZE, build_response, is_digest
 
 TAG_SEP = ':'
 REPO_SEP = '/'
 MANIFEST_VERSION = 'v2'
+USER_AGENT = 'AySA-Command-Line-Tool'
+POOL_SIZE = 10
+PAGE_SIZE = 100
+JOBS = 4
+TIMEOUT = 10
+TOKEN_EXPIRES = 60
+TOKEN_MARGIN = 5
+REF_CACHE_SIZE = 65536
+RETRIES = 3
+BACKOFF = 0.5
+BACKOFF_MAX = 30
+BREAKER_WINDOW = 20
+BREAKER_RATIO = 0.5
+BREAKER_COOLDOWN = 30
+RETRY_STATUS = (429, 502, 503, 504)
+THROTTLE_STATUS = (429, 503)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+INFLIGHT_POLL = 0.01
 MEDIA_TYPES = {
     'v1': 'application/vnd.docker.distribution.manifest.v1+json',
     'v2': 'application/vnd.docker.distribution.manifest.v2+json',
@@ -30,6 +61,12 @@ rx_schema = re.compile(r'(localhost|.*\.local(?:host)?(?::\d{1,5})?)$', re.I)
 rx_registry = re.compile(r'^(localhost|[\w\-]+(\.[\w\-]+)+)(?::\d{1,5})?\/',
                          re.I)
 rx_repository = re.compile(r'^[a-z0-9]+(?:[/:._-][a-z0-9]+)*$')
+rx_reference = re.compile(r'^(?P<registry>(?:localhost|[\w\-]+(?:\.[\w\-]+)+)'
+                          r'(?::\d{1,5})?\/)?'
+                          r'(?P<repository>(?:(?P<namespace>[^:]+)\/)?'
+                          r'(?P<image>[^/:]+))(?::(?P<tag>[^:/]+))?$', re.I)
+rx_challenge = re.compile(r'(\w+)="([^"]*)"')
+rx_scope = re.compile(r'^/v2/(.+?)/(?:manifests|tags|blobs)/')
 
 
 # methods >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
@@ -92,6 +129,28 @@ def get_parts(value):
     }
 
 
+@lru_cache(maxsize=REF_CACHE_SIZE)
+def parse_image(value):
+    """
+    Versión compacta de `get_parts`, analiza la referencia en una única
+    pasada y retorna un `ImageRef` (memoizado, no debe modificarse).
+    """
+    r = rx_reference.match(value)
+    if r is None or not rx_repository.match(r.group('repository')):
+        raise RegistryError('El endpoint "{}" está mal formateado.'
+                            .format(value))
+    registry, repository, namespace, image, tag = r.groups()
+    return ImageRef(registry and sys.intern(registry),
+                    sys.intern(repository),
+                    namespace and sys.intern(namespace),
+                    image,
+                    tag and sys.intern(tag))
+
+
+def parse_many(values):
+    return [parse_image(x) for x in values]
+
+
 def validate_token(value, exclude='|#@'):
     return value and ''.join([x for x in value if x not in exclude]) == value
 
@@ -100,17 +159,557 @@ def scheme(endpoint):
     return 'http' if rx_schema.match(endpoint) else 'https'
 
 
+def to_bool(value, default=False):
+    if value is None:
+        return default
+    return str(value).lower() in ('true', 'yes', 'si', 'y', 's', '1')
+
+
+def to_int(value, default=None):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def to_float(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def bounded_map(func, iterable, jobs=JOBS, lookahead=None):
+    """
+    Aplica `func` sobre cada elemento de `iterable` utilizando `jobs` hilos,
+    los resultados se retornan en el mismo orden de entrada y nunca existen
+    más de `lookahead` elementos en vuelo. Si se interrumpe, los elementos
+    pendientes se cancelan.
+    """
+    jobs = max(1, to_int(jobs, JOBS))
+    if jobs == 1:
+        for item in iterable:
+            yield func(item)
+        return
+    lookahead = max(jobs, to_int(lookahead, jobs * 2))
+    with ThreadPoolExecutor(jobs) as executor:
+        queue = deque()
+        try:
+            for item in iterable:
+                queue.append(executor.submit(func, item))
+                if len(queue) >= lookahead:
+                    yield queue.popleft().result()
+            while queue:
+                yield queue.popleft().result()
+        finally:
+            for x in queue:
+                x.cancel()
+
+
+def parse_challenge(value):
+    scheme, _, params = (value or '').strip().partition(' ')
+    return scheme.lower(), dict(rx_challenge.findall(params))
+
+
+def get_token_scope(method, url):
+    """
+    Deduce el `scope` del token necesario para el request, ex:
+    `repository:{name}:pull` o `registry:catalog:*`.
+    """
+    r = rx_scope.match(urlparse(url).path)
+    if r is None:
+        return 'registry:catalog:*'
+    if method in ('GET', 'HEAD'):
+        actions = 'pull'
+    elif method == 'DELETE':
+        actions = '*'
+    else:
+        actions = 'pull,push'
+    return 'repository:{}:{}'.format(r.group(1), actions)
+
+
+def get_next_last(response):
+    """
+    Obtiene el valor `last` del header `Link` (rel="next") de la respuesta,
+    retorna `None` cuando no existen más páginas.
+    """
+    link = response.links.get('next', None)
+    if link is None:
+        return None
+    last = parse_qs(urlparse(link['url']).query).get('last', None)
+    return last[0] if last else None
+
+
+def is_failure(status_code):
+    return status_code >= 500
+
+
+def get_retry_after(response):
+    """
+    Retorna los segundos indicados en el header `Retry-After` (segundos o
+    fecha HTTP), `None` cuando no está definido.
+    """
+    value = response.headers.get('Retry-After', None)
+    if value is None:
+        return None
+    seconds = to_float(value, None)
+    if seconds is None:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return max(0.0, seconds)
+
+
+def backoff(attempt, base=BACKOFF, cap=BACKOFF_MAX, retry_after=None):
+    """
+    Espera exponencial con `jitter` completo, cuando el servidor define
+    `Retry-After` se respeta (hasta `cap` segundos).
+    """
+    if retry_after is not None:
+        return min(cap, retry_after)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def check_response(response):
+    if response.ok:
+        return response
+    try:
+        error = codec.loads(response.content)['errors'][0]
+        message = '{}: {}'.format(error['code'], error['message'])
+    except (ValueError, KeyError, IndexError, TypeError):
+        message = '{}: {}'.format(response.status_code, response.reason)
+    raise RegistryError(message)
+
+
+class CircuitBreaker:
+    """
+    Abre el circuito cuando la proporción de fallas (`5xx` o errores de
+    conexión) en las últimas `window` respuestas alcanza `ratio`, las
+    respuestas `429` sólo reducen la concurrencia (`AdaptiveLimit`). Mientras
+    está abierto los requests fallan de inmediato; pasados `cooldown`
+    segundos se permite un único request de prueba que decide si el
+    circuito se cierra o vuelve a abrirse. Los resultados de los requests
+    que estaban en vuelo al abrirse el circuito se descartan.
+    """
+    def __init__(self, window=BREAKER_WINDOW, ratio=BREAKER_RATIO,
+                 cooldown=BREAKER_COOLDOWN):
+        self.window = max(1, to_int(window, BREAKER_WINDOW))
+        self.ratio = to_float(ratio, BREAKER_RATIO)
+        self.cooldown = to_float(cooldown, BREAKER_COOLDOWN)
+        self._results = deque(maxlen=self.window)
+        self._opened = None
+        self._probe = False
+        self._generation = 1
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened is None:
+            return 'closed'
+        if time.monotonic() - self._opened < self.cooldown:
+            return 'open'
+        return 'half-open'
+
+    def allow(self):
+        """
+        Retorna `False` cuando el request no está permitido, de lo contrario
+        la generación del circuito, que se debe informar en `record`.
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return self._generation
+            if state == 'open' or self._probe:
+                return False
+            self._probe = True
+            return self._generation
+
+    def record(self, success, generation=None):
+        """
+        Registra el resultado de un request, `None` indica que no hubo
+        resultado (por ejemplo, una interrupción): no modifica el estado
+        pero libera el request de prueba.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if success is None:
+                if self._opened is not None and generation is not None:
+                    self._probe = False
+                return
+            if self._opened is not None:
+                if generation is None or not self._probe:
+                    return
+                self._opened = None if success else time.monotonic()
+                self._probe = False
+                self._generation += 1
+                self._results.clear()
+                return
+            self._results.append(success)
+            if len(self._results) >= self.window and \
+                    self._results.count(False) / self.window >= self.ratio:
+                self._opened = time.monotonic()
+                self._generation += 1
+
+
+class AdaptiveLimit:
+    """
+    Límite de concurrencia compartido (AIMD): ante una respuesta `429` o
+    `503` se reduce a la mitad (como máximo una vez por `interval`) y crece
+    de a un request por cada `limit` respuestas exitosas, hasta `maximum`.
+    Los hilos que exceden el límite esperan su turno.
+    """
+    interval = 1.0
+
+    def __init__(self, maximum=POOL_SIZE, minimum=1):
+        self.maximum = max(1, to_int(maximum, POOL_SIZE))
+        self.minimum = max(1, min(to_int(minimum, 1), self.maximum))
+        self.limit = float(self.maximum)
+        self.inflight = 0
+        self.throttled = 0
+        self._decreased = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self.inflight -= 1
+            if throttled:
+                self.throttled += 1
+                now = time.monotonic()
+                if now - self._decreased >= self.interval:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._decreased = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class Budget:
+    """
+    Presupuesto de tráfico: `rps` requests por segundo (token bucket, con
+    ráfagas de hasta `rps` requests) y `inflight` requests en vuelo. Un
+    valor vacío o `0` indica sin límite.
+    """
+    def __init__(self, rps=None, inflight=None):
+        self.rps = to_float(rps, 0) or 0
+        self.inflight = to_int(inflight, 0) or 0
+        self.capacity = max(1.0, self.rps)
+        self.waited = 0.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._running = 0
+        self._cond = threading.Condition()
+
+    def reserve(self):
+        """
+        Reserva un token y retorna los segundos que se deben esperar antes
+        de enviar el request.
+        """
+        if not self.rps:
+            return 0.0
+        with self._cond:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens
+                               + (now - self._updated) * self.rps)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rps if self._tokens < 0 else 0.0
+            self.waited += wait
+            return wait
+
+    def enter(self, blocking=True):
+        if not self.inflight:
+            return True
+        with self._cond:
+            while self._running >= self.inflight:
+                if blocking is not True:
+                    return False
+                self._cond.wait()
+            self._running += 1
+            return True
+
+    def leave(self):
+        if not self.inflight:
+            return
+        with self._cond:
+            self._running -= 1
+            self._cond.notify()
+
+
+class RateLimiter:
+    """
+    Limitador compartido por todos los hilos y tareas que utilizan el
+    `registry`, con presupuestos separados para lecturas (`GET`, `HEAD`) y
+    escrituras (`PUT`, `DELETE`). Cuando no se definen límites de escritura
+    las escrituras comparten el presupuesto de lectura, si se define sólo
+    uno de ellos el otro toma el valor de lectura.
+    """
+    def __init__(self, max_rps=None, max_inflight=None, max_write_rps=None,
+                 max_write_inflight=None):
+        self.settings = get_rate_settings(max_rps, max_inflight,
+                                          max_write_rps, max_write_inflight)
+        max_rps, max_inflight, max_write_rps, max_write_inflight = \
+            self.settings
+        self.read = Budget(max_rps, max_inflight)
+        if max_write_rps or max_write_inflight:
+            self.write = Budget(max_write_rps or max_rps,
+                                max_write_inflight or max_inflight)
+        else:
+            self.write = self.read
+
+    @property
+    def waited(self):
+        if self.write is self.read:
+            return self.read.waited
+        return self.read.waited + self.write.waited
+
+    def budget(self, method):
+        return self.read if method in READ_METHODS else self.write
+
+    def acquire(self, method):
+        budget = self.budget(method)
+        budget.enter()
+        try:
+            wait = budget.reserve()
+            if wait:
+                time.sleep(wait)
+        except BaseException:
+            budget.leave()
+            raise
+
+    async def acquire_async(self, method):
+        import asyncio
+        budget = self.budget(method)
+        while not budget.enter(False):
+            await asyncio.sleep(INFLIGHT_POLL)
+        try:
+            wait = budget.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+        except BaseException:
+            budget.leave()
+            raise
+
+    def release(self, method):
+        self.budget(method).leave()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_settings(max_rps=None, max_inflight=None, max_write_rps=None,
+                      max_write_inflight=None):
+    return (to_float(max_rps, 0) or 0, to_int(max_inflight, 0) or 0,
+            to_float(max_write_rps, 0) or 0,
+            to_int(max_write_inflight, 0) or 0)
+
+
+def get_rate_limiter(host, max_rps=None, max_inflight=None,
+                     max_write_rps=None, max_write_inflight=None):
+    """
+    Retorna el limitador del proceso para el `host`, compartido entre todas
+    las instancias con la misma configuración. Si la configuración cambia
+    (por ejemplo, al recargar el `config.ini` en el `daemon`) se crea uno
+    nuevo, las instancias existentes conservan el anterior.
+    """
+    settings = get_rate_settings(max_rps, max_inflight, max_write_rps,
+                                 max_write_inflight)
+    with _limiters_lock:
+        limiter = _limiters.get(host, None)
+        if limiter is None or limiter.settings != settings:
+            limiter = _limiters[host] = RateLimiter(*settings)
+        return limiter
+
+
+class TokenCache:
+    """
+    Tokens `Bearer` por `scope`, compartidos entre hilos y reutilizados
+    hasta su vencimiento.
+    """
+    def __init__(self):
+        self._tokens = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def lock(self, scope):
+        with self._lock:
+            return self._locks.setdefault(scope, threading.Lock())
+
+    def get(self, scope):
+        value = self._tokens.get(scope, None)
+        if value is not None and value[1] > time.time() + TOKEN_MARGIN:
+            return value[0]
+        return None
+
+    def set(self, scope, token, expires_in=TOKEN_EXPIRES):
+        expires = time.time() + (to_int(expires_in, None) or TOKEN_EXPIRES)
+        self._tokens[scope] = (token, expires)
+
+    def discard(self, scope, token):
+        """
+        Elimina el token del `scope` sólo si es `token`, si otro hilo ya lo
+        renovó se conserva el nuevo.
+        """
+        value = self._tokens.get(scope, None)
+        if value is not None and value[0] == token:
+            del self._tokens[scope]
+
+
+class RegistryAuth(AuthBase):
+    """
+    Autenticación `Basic` y `Bearer` (token), ante un desafío
+    `WWW-Authenticate: Bearer ...` solicita el token al `realm` y
+    reintenta el request.
+    """
+    def __init__(self, credentials=None, verify=True, tokens=None,
+                 timeout=TIMEOUT):
+        self.credentials = credentials
+        self.verify = verify
+        self.tokens = tokens if tokens is not None else TokenCache()
+        self.timeout = timeout
+
+    def __call__(self, r):
+        token = self.tokens.get(get_token_scope(r.method, r.url))
+        if token is not None:
+            r.headers['Authorization'] = 'Bearer ' + token
+        elif self.credentials is not None:
+            r.headers['Authorization'] = _basic_auth_str(*self.credentials)
+        r.register_hook('response', self.handle_401)
+        return r
+
+    def handle_401(self, r, **kwargs):
+        if r.status_code != 401:
+            return r
+        scheme, params = parse_challenge(r.headers.get('WWW-Authenticate'))
+        if scheme != 'bearer' or 'realm' not in params:
+            return r
+        scope = get_token_scope(r.request.method, r.request.url)
+        rejected = r.request.headers.get('Authorization', '')
+        rejected = rejected[7:] if rejected.startswith('Bearer ') else None
+        token = self.token(scope, params, rejected)
+        r.content
+        r.close()
+        prep = r.request.copy()
+        prep.headers['Authorization'] = 'Bearer ' + token
+        _r = r.connection.send(prep, **kwargs)
+        _r.history.append(r)
+        _r.request = prep
+        return _r
+
+    def token(self, scope, challenge, rejected=None):
+        with self.tokens.lock(scope):
+            if rejected is not None:
+                self.tokens.discard(scope, rejected)
+            token = self.tokens.get(scope)
+            if token is not None:
+                return token
+            params = {'service': challenge.get('service', None),
+                      'scope': challenge.get('scope', scope)}
+            auth = HTTPBasicAuth(*self.credentials) \
+                if self.credentials is not None else None
+            response = requests.get(challenge['realm'], params=params,
+                                    auth=auth, verify=self.verify,
+                                    timeout=self.timeout)
+            if not response.ok:
+                raise RegistryError('No se pudo obtener el token para "{}": '
+                                    '{} {}'.format(scope, response.status_code,
+                                                   response.reason))
+            data = codec.loads(response.content)
+            token = data.get('token', None) or data.get('access_token', None)
+            if not token:
+                raise RegistryError('La respuesta del servidor de tokens no '
+                                    'contiene un token.')
+            self.tokens.set(scope, token, data.get('expires_in', None))
+            return token
+
+
+class CountingAdapter(HTTPAdapter):
+    """
+    `HTTPAdapter` que cuenta las conexiones TCP establecidas (incluidas las
+    reconexiones), `num_connections` de los pools sólo cuenta los objetos
+    conexión creados.
+    """
+    def __init__(self, *args, **kwargs):
+        self.connects = 0
+        self._connects_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self._count(self.poolmanager)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        manager = super().proxy_manager_for(*args, **kwargs)
+        self._count(manager)
+        return manager
+
+    def _count(self, manager):
+        if getattr(manager, 'counted', False) is True:
+            return
+        manager.pool_classes_by_scheme = {
+            k: self._pool_class(v)
+            for k, v in manager.pool_classes_by_scheme.items()}
+        manager.counted = True
+
+    def _pool_class(self, pool_class):
+        adapter = self
+
+        class Connection(pool_class.ConnectionCls):
+            def connect(self):
+                super().connect()
+                with adapter._connects_lock:
+                    adapter.connects += 1
+
+        return type(pool_class.__name__, (pool_class,),
+                    {'ConnectionCls': Connection})
+
+
 class Registry:
     """
     Registry Client (simple)
+
+    La sesión HTTP es única por instancia y se comparte entre todos los
+    hilos, de esta forma las conexiones (TCP + TLS) se reutilizan entre los
+    distintos requests al `registry`.
     """
     def __init__(self, host, insecure=False, verify=True, credentials=None,
-                 **kwargs):
+                 pool_size=POOL_SIZE, keep_alive=True, timeout=TIMEOUT,
+                 cache=False, cache_path=None, cache_ttl=CACHE_TTL,
+                 cache_size=CACHE_SIZE, cache_refresh=False, retries=RETRIES,
+                 backoff=BACKOFF, breaker=True, max_rps=None,
+                 max_inflight=None, max_write_rps=None,
+                 max_write_inflight=None, **kwargs):
         self.host = host
         self.insecure = insecure
         self.verify = verify if insecure is False else True
         self.scheme = scheme(host) if insecure is False else 'http'
         self.credentials = credentials
+        self.pool_size = max(1, to_int(pool_size, POOL_SIZE))
+        self.keep_alive = to_bool(keep_alive, True)
+        self.timeout = to_int(timeout, TIMEOUT)
+        self.cache = HttpCache(cache_path, to_int(cache_ttl, CACHE_TTL),
+                               to_int(cache_size, CACHE_SIZE),
+                               to_bool(cache_refresh)) \
+            if to_bool(cache) else None
+        self.retries = max(0, to_int(retries, RETRIES))
+        self.backoff = to_float(backoff, BACKOFF)
+        self.breaker = CircuitBreaker() if to_bool(breaker, True) else None
+        self.limit = AdaptiveLimit(self.pool_size)
+        self.limiter = get_rate_limiter(host, max_rps, max_inflight,
+                                        max_write_rps, max_write_inflight)
+        self.retried = 0
+        self.tokens = TokenCache()
+        self._session = None
+        self._adapters = []
+        self._lock = threading.Lock()
 
     def get_baseurl(self):
         return '{}://{}/v2'.format(self.scheme, self.host)
@@ -120,28 +719,190 @@ class Registry:
             return self.credentials.split(':')
         return self.credentials
 
-    def session(self, headers=None, timeout=10):
+    def session(self, headers=None):
         s = requests.Session()
-        if self.credentials is not None:
-            s.auth = HTTPBasicAuth(*self.get_credentials(True))
+        credentials = self.get_credentials(True) \
+            if self.credentials is not None else None
+        s.auth = RegistryAuth(credentials, self.verify, self.tokens,
+                              self.timeout)
         s.headers.update(headers or {})
-        s.headers['User-Agent'] = 'AySA-Command-Line-Tool'
+        s.headers['User-Agent'] = USER_AGENT
+        if self.keep_alive is False:
+            s.headers['Connection'] = 'close'
         s.verify = self.verify
-        s.timeout = timeout
+        for prefix in ('http://', 'https://'):
+            adapter = CountingAdapter(pool_connections=self.pool_size,
+                                      pool_maxsize=self.pool_size,
+                                      pool_block=True)
+            s.mount(prefix, adapter)
+            self._adapters.append(adapter)
         return s
 
-    def request(self, method, *args, **kwargs):
-        headers = kwargs.pop('headers', {})
-        with self.session(headers) as req:
-            response = req.request(method, *args, **kwargs)
-            try:
-                response.raise_for_status()
-            except requests.HTTPError:
-                data = response.json()
-                if 'errors' in data:
-                    error = data['errors'][0]
-                    raise RegistryError('{code}: {message}'.format(**error))
+    @property
+    def client(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self.session()
+        return self._session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                metrics.record_pool(self.stats())
+                self._session.close()
+                self._session = None
+                self._adapters = []
+
+    def stats(self):
+        connections = requests_count = 0
+        for adapter in self._adapters:
+            connections += adapter.connects
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_count += pool.num_requests
+        return {
+            'requests': requests_count,
+            'connections': connections,
+            'reused': max(0, requests_count - connections),
+            'retries': self.retried,
+            'throttled': self.limit.throttled,
+            'limit': int(self.limit.limit),
+            'waited': self.limiter.waited
+        }
+
+    def request(self, method, url, *args, strict=True, endpoint=None,
+                revalidate=False, **kwargs):
+        """
+        Cuando `strict` es verdadero, las respuestas de error se elevan como
+        `RegistryError`, de lo contrario se retornan al llamador. El
+        `endpoint` agrupa las métricas, por defecto la ruta de la `url`.
+        Con `revalidate` las entradas de la `cache` se validan siempre con
+        el servidor (`If-None-Match`), aunque no hayan vencido.
+        """
+        if not metrics.enabled:
+            return self._dispatch(method, url, *args, strict=strict,
+                                  revalidate=revalidate, **kwargs)
+        started = time.perf_counter()
+        status, sent, received, cached = 'error', 0, 0, False
+        try:
+            response = self._dispatch(method, url, *args, strict=False,
+                                      revalidate=revalidate, **kwargs)
+            status = response.status_code
+            cached = getattr(response, 'from_cache', False)
+            received = len(response.content or b'')
+            data = kwargs.get('data', None)
+            sent = len(data) if isinstance(data, (bytes, str)) else 0
+        finally:
+            metrics.record(method, endpoint or get_endpoint(url), status,
+                           time.perf_counter() - started, sent, received,
+                           cached)
+        return check_response(response) if strict is True else response
+
+    def _dispatch(self, method, url, *args, strict=True, **kwargs):
+        with phases.phase('network'):
+            return self._dispatch_request(method, url, *args, strict=strict,
+                                          **kwargs)
+
+    def _dispatch_request(self, method, url, *args, strict=True,
+                          revalidate=False, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if self.cache is None or method not in ('GET', 'PUT', 'DELETE'):
+            response = self._request(method, url, *args, **kwargs)
+        elif method == 'GET':
+            response = self._cached_request(url, *args,
+                                            revalidate=revalidate, **kwargs)
+        else:
+            response = self._request(method, url, *args, **kwargs)
+            self.cache.invalidate(url)
+        return check_response(response) if strict is True else response
+
+    def _cached_request(self, url, *args, revalidate=False, **kwargs):
+        key = self.cache.key(url, kwargs.get('params', None),
+                             kwargs.get('headers', None))
+        entry = self.cache.get(key)
+        if entry is not None:
+            meta, body = entry
+            if revalidate is not True and self.cache.is_fresh(meta):
+                response = build_response(meta, body)
+                response.from_cache = True
+                return response
+            etag = meta['headers'].get('ETag', None)
+            if etag is not None:
+                headers = dict(kwargs.get('headers', None) or {})
+                headers['If-None-Match'] = etag
+                kwargs['headers'] = headers
+        response = self._request('GET', url, *args, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self.cache.touch(key)
+            response = build_response(*entry)
+            response.from_cache = True
+            return response
+        if response.status_code == 200:
+            self.cache.set(key, response)
+        return response
+
+    def _request(self, method, *args, **kwargs):
+        """
+        Los métodos idempotentes se reintentan ante fallas de conexión y
+        respuestas `429`, `502`, `503` o `504`, con espera exponencial.
+        """
+        retries = self.retries if method in IDEMPOTENT_METHODS else 0
+        attempt = 0
+        while 1:
+            response = self._send(method, attempt < retries, *args,
+                                  **kwargs)
+            if response is not None:
+                if attempt >= retries \
+                        or response.status_code not in RETRY_STATUS:
+                    return response
+                retry_after = get_retry_after(response)
+                response.close()
+            else:
+                retry_after = None
+            time.sleep(backoff(attempt, self.backoff,
+                               retry_after=retry_after))
+            attempt += 1
+            self.retried += 1
+
+    def _send(self, method, retry, *args, **kwargs):
+        """
+        Envía el request respetando el `circuit breaker` y el límite de
+        concurrencia, cuando `retry` es verdadero retorna `None` ante una
+        falla de conexión.
+        """
+        generation = self.breaker.allow() if self.breaker is not None \
+            else True
+        if not generation:
+            raise CircuitOpenError(self.host)
+        throttled, success, acquired = False, None, 0
+        try:
+            self.limiter.acquire(method)
+            acquired += 1
+            self.limit.acquire()
+            acquired += 1
+            response = self.client.request(method, *args, **kwargs)
+            throttled = response.status_code in THROTTLE_STATUS
+            success = not is_failure(response.status_code)
             return response
+        except (requests.ConnectionError, requests.Timeout):
+            success = False
+            if retry is not True:
+                raise
+            return None
+        except Exception:
+            success = False
+            raise
+        finally:
+            if acquired > 1:
+                self.limit.release(throttled)
+            if acquired > 0:
+                self.limiter.release(method)
+            if self.breaker is not None:
+                self.breaker.record(success, generation)
 
 
 class Entity:
@@ -165,58 +926,92 @@ class Entity:
             raise RegistryError('Método "{}" no soportado para "{}".'
                                 .format(method, self.url))
         url = self.client.get_baseurl() + self.url
+        kwargs.setdefault('endpoint', '/v2' + (self.url_template or self.url))
         response = self.client.request(method, url, *args, **kwargs)
         return response
 
     def json(self, method, *args, **kwargs):
-        return self.request(method, *args, **kwargs).json()
+        return codec.loads(self.request(method, *args, **kwargs).content)
 
 
 class IterEntity(Entity):
     response_key = None
-    response_data = None
 
-    def __init__(self, client, prefix_filter=None):
+    def __init__(self, client, prefix_filter=None, page_size=PAGE_SIZE):
         self.client = client
         self.prefix_filter = prefix_filter
-
-    def get(self, *args, **kwargs):
-        response_data = self.json('GET', *args, **kwargs)
+        self.page_size = max(1, to_int(page_size, PAGE_SIZE))
+
+    def get(self, last=None, **kwargs):
+        params = {'n': self.page_size}
+        if last is not None:
+            params['last'] = last
+        response = self.request('GET', params=params, **kwargs)
+        response_data = codec.loads(response.content)
         if self.response_key not in response_data:
             raise RegistryError('La clave "{}" no se encuentra dentro de la '
                                 'respuesta.'.format(self.response_key))
-        self.response_data = response_data[self.response_key]
+        return response_data[self.response_key] or [], \
+            get_next_last(response)
 
-    def __iter__(self):
-        if self.response_data is None:
-            self.get()
+    def pages(self, last=None, **kwargs):
+        while 1:
+            items, last = self.get(last, **kwargs)
+            if items:
+                yield items
+            if last is None:
+                break
 
-        for item in self.response_data:
-            if self.prefix_filter and not item.startswith(self.prefix_filter):
-                continue
-            yield item
+    def __iter__(self):
+        for page in self.pages():
+            for item in page:
+                if self.prefix_filter \
+                        and not item.startswith(self.prefix_filter):
+                    continue
+                yield item
 
 
 class Catalog(IterEntity):
+    """
+    El catálogo se encuentra ordenado lexicográficamente, por lo tanto cuando
+    se define `prefix_filter` la iteración comienza directamente en el
+    prefijo (`last=`) y finaliza al superarlo.
+    """
     url = '/_catalog'
     methods_supported = 'GET'
     response_key = 'repositories'
 
+    def seek(self):
+        prefix = self.prefix_filter
+        if not prefix or prefix[-1] <= '\x00':
+            return None
+        return prefix[:-1] + chr(ord(prefix[-1]) - 1)
+
+    def __iter__(self):
+        prefix = self.prefix_filter
+        for page in self.pages(self.seek()):
+            for item in page:
+                if prefix and not item.startswith(prefix):
+                    if item > prefix:
+                        return
+                    continue
+                yield item
+
 
 class Tags(IterEntity):
     url_template = '/{name}/tags/list'
     methods_supported = 'GET'
     response_key = 'tags'
 
-    def __init__(self, client, name, prefix_filter=None):
-        super().__init__(client, prefix_filter)
+    def __init__(self, client, name, prefix_filter=None, page_size=PAGE_SIZE):
+        super().__init__(client, prefix_filter, page_size)
         self.set_url(name=name)
 
 
 class SlimManifest(Entity):
     url_template = '/{name}/manifests/{reference}'
     media_type = 'v2'
-    methods_supported = 'GET,PUT,DELETE'
+    methods_supported = 'GET,HEAD,PUT,DELETE'
 
     def __init__(self, client, name, reference):
         super().__init__(client)
@@ -227,48 +1022,184 @@ class SlimManifest(Entity):
         media_type = get_media_type(self.media_type, obj=False)
         update = {'Accept': '*/*', 'Content-Type': media_type} \
             if method in ('PUT', 'DELETE') else {'Accept': media_type}
-        headers.update(update)
+        for k, v in update.items():
+            headers.setdefault(k, v)
         kwargs['headers'] = headers
         return super().request(method, *args, **kwargs)
 
+    def digest(self, **kwargs):
+        """
+        Resuelve el `digest` mediante `HEAD`, sin descargar el manifiesto,
+        retorna `None` cuando la referencia no existe.
+        """
+        r = self.request('HEAD', strict=False, **kwargs)
+        if r.status_code == 404:
+            return None
+        if not r.ok:
+            raise RegistryError('{}: {}'.format(r.status_code, r.reason))
+        return r.headers.get('Docker-Content-Digest', None)
+
 
 class FatManifest(SlimManifest):
     media_type = 'v2f'
+    methods_supported = 'GET,HEAD'
+
+
+class Blob(Entity):
+    url_template = '/{name}/blobs/{digest}'
     methods_supported = 'GET'
 
+    def __init__(self, client, name, digest):
+        super().__init__(client)
+        self.set_url(name=name, digest=digest)
+
 
 class Api:
     def __init__(self, host, insecure=False, verify=True, credentials=None,
-                 **kwargs):
-        self.registry = Registry(host, insecure, verify, credentials)
+                 page_size=PAGE_SIZE, store=False, store_size=STORE_SIZE,
+                 cache_path=None, **kwargs):
+        self.registry = Registry(host, insecure, verify, credentials,
+                                 cache_path=cache_path, **kwargs)
+        self.page_size = page_size
+        self.store = BlobStore((cache_path or CACHE_PATH)
+                               if to_bool(store) else None,
+                               to_int(store_size, STORE_SIZE))
 
-    def catalog(self, prefix_filter=None):
-        return Catalog(self.registry, prefix_filter)
+    def close(self):
+        self.registry.close()
 
-    def tags(self, name, prefix_filter=None):
-        return Tags(self.registry, name, prefix_filter)
+    def stats(self):
+        return self.registry.stats()
 
-    def put_tag(self, name, reference, target):
-        return self.put_manifest(name, target, self.manifest(name, reference))
+    def catalog(self, prefix_filter=None, page_size=None):
+        return Catalog(self.registry, prefix_filter,
+                       page_size or self.page_size)
 
-    def delete_tag(self, name, reference):
-        return self.del_manifest(name, self.digest(name, reference))
+    def tags(self, name, prefix_filter=None, page_size=None):
+        return Tags(self.registry, name, prefix_filter,
+                    page_size or self.page_size)
 
-    def digest(self, name, reference, **kwargs):
-        r = self.get_manifest(name, reference)
-        return r.headers.get('Docker-Content-Digest', None)
+    def put_tag(self, name, reference, target):
+        """
+        Crea el `tag` enviando exactamente los bytes del manifiesto origen,
+        con su `Content-Type`, de esta forma el `digest` no se altera. El
+        origen se valida siempre con el `registry`, nunca desde la `cache`.
+        """
+        _, content_type, content = self.raw_manifest(name, reference,
+                                                     revalidate=True)
+        return self.put_manifest(name, target, content, content_type)
+
+    def untag(self, name, reference):
+        """
+        Elimina únicamente el `tag`. La API v2 elimina manifiestos (y con
+        ellos todos sus `tags`), por lo tanto el `tag` se apunta a una copia
+        del manifiesto que sólo difiere en espacios finales (`digest`
+        único) y luego se elimina esa copia.
+        """
+        _, content_type, content = self.raw_manifest(name, reference,
+                                                     revalidate=True)
+        padding = ''.join(' \t'[int(x)] for x in
+                          '{:0128b}'.format(uuid.uuid4().int))
+        content = content.rstrip() + b'\n' + padding.encode()
+        self.put_manifest(name, reference, content, content_type)
+        return self.del_manifest(
+            name, 'sha256:' + hashlib.sha256(content).hexdigest())
+
+    def delete_tag(self, name, reference, digest=None):
+        digest = digest or self.digest(name, reference)
+        if digest is None:
+            raise RegistryError('La imagen "{}:{}" no existe.'
+                                .format(name, reference))
+        return self.del_manifest(name, digest)
+
+    def digest(self, name, reference, fat=False, **kwargs):
+        return self._manifest(name, reference, fat).digest(**kwargs)
+
+    def digests(self, pairs, jobs=JOBS, **kwargs):
+        """
+        Resuelve de forma concurrente los `digests` de una lista de pares
+        `(repository, tag)`, retorna un diccionario `{(repository, tag):
+        digest}`, el valor es `None` cuando la imagen no existe.
+        """
+        def fetch(pair):
+            return pair, self.digest(*pair, **kwargs)
+        return dict(bounded_map(fetch, pairs, jobs))
+
+    def inspect(self, name, reference, **kwargs):
+        """
+        Obtiene el manifiesto y su `digest`, para el `schema 2` el historial
+        se lee del blob de configuración.
+        """
+        digest, _, content = self.raw_manifest(name, reference, **kwargs)
+        m = Manifest(codec.loads(content), digest)
+        if m.config is not None:
+            m._history = codec.loads(self.raw_blob(name, m.config)[1])
+        return m
+
+    def raw_manifest(self, name, reference, **kwargs):
+        """
+        Retorna `(digest, content_type, content)` del manifiesto. Los
+        manifiestos se consultan primero en el almacén por `digest`; un
+        `tag` se resuelve con `HEAD` sólo cuando su último `digest` conocido
+        ya está en el almacén, de lo contrario se descarga directamente y
+        el `digest` se toma de la respuesta.
+        """
+        digest = reference if is_digest(reference) else None
+        if digest is None and self.store.has(
+                self.store.get_ref(name, reference)):
+            digest = self.digest(name, reference)
+            if digest is None:
+                raise RegistryError('La imagen "{}:{}" no existe.'
+                                    .format(name, reference))
+        value = self.store.get(digest)
+        if value is not None:
+            return (digest,) + value
+        r = self.get_manifest(name, digest or reference, **kwargs)
+        digest = digest or r.headers.get('Docker-Content-Digest', None) \
+            or self.digest(name, reference)
+        content_type = r.headers.get('Content-Type', None)
+        self.store.set(digest, r.content, content_type)
+        self.store.set_ref(name, reference, digest)
+        return digest, content_type, r.content
+
+    def raw_blob(self, name, digest, **kwargs):
+        """
+        Retorna `(content_type, content)` del blob, consultando primero
+        el almacén por `digest`.
+        """
+        value = self.store.get(digest)
+        if value is None:
+            r = self.blob(name, digest, **kwargs)
+            value = (r.headers.get('Content-Type', None), r.content)
+            self.store.set(digest, r.content, value[0])
+        return value
+
+    def blob(self, name, digest, **kwargs):
+        return Blob(self.registry, name, digest).request('GET', **kwargs)
 
     def manifest(self, name, reference, fat=False, obj=False, **kwargs):
-        r = self.get_manifest(name, reference, fat).json()
-        return Manifest(r) if obj is True else r
+        if fat is True:
+            digest = None
+            r = codec.loads(
+                self.get_manifest(name, reference, fat, **kwargs).content)
+        else:
+            digest, _, content = self.raw_manifest(name, reference, **kwargs)
+            r = codec.loads(content)
+        return Manifest(r, digest) if obj is True else r
 
     def get_manifest(self, name, reference, fat=False, **kwargs):
         return self._manifest(name, reference, fat)\
                    .request('GET', **kwargs)
 
-    def put_manifest(self, name, reference, manifest, **kwargs):
+    def put_manifest(self, name, reference, manifest, content_type=None,
+                     **kwargs):
+        if not isinstance(manifest, bytes):
+            manifest = codec.dumpb(manifest)
+        kwargs['data'] = manifest
+        if content_type is not None:
+            kwargs.setdefault('headers', {})['Content-Type'] = content_type
         return self._manifest(name, reference)\
-                   .request('PUT', json=manifest, **kwargs)
+                   .request('PUT', **kwargs)
 
     def del_manifest(self, name, reference, **kwargs):
         return self._manifest(name, reference)\
@@ -316,10 +1247,52 @@ class Image:
         return self.image > other.image
 
 
+class ImageRef:
+    __slots__ = ('registry', 'repository', 'namespace', 'image', 'tag')
+
+    def __init__(self, registry, repository, namespace, image, tag):
+        self.registry = registry
+        self.repository = repository
+        self.namespace = namespace
+        self.image = image
+        self.tag = tag
+
+    @property
+    def value(self):
+        if self.tag is None:
+            return '{}{}'.format(self.registry or '', self.repository)
+        return self.full
+
+    @property
+    def image_tag(self):
+        return '{}:{}'.format(self.repository, self.tag)
+
+    @property
+    def full(self):
+        return '{}{}'.format(self.registry or '', self.image_tag)
+
+    def __str__(self):
+        return '<{} Namespace="{}" Image="{}" Tag="{}">'\
+               .format(self.registry or '',
+                       self.namespace or '',
+                       self.image or '',
+                       self.tag or '')
+
+    def __repr__(self):
+        return self.image
+
+    def __lt__(self, other):
+        return self.image < other.image
+
+    def __gt__(self, other):
+        return self.image > other.image
+
+
 class Manifest:
-    def __init__(self, raw):
+    def __init__(self, raw, digest=None, history=None):
         self._raw = raw
-        self._history = None
+        self._history = history
+        self.digest = digest
 
     @property
     def name(self):
@@ -333,12 +1306,17 @@ class Manifest:
     def layers(self):
         return self._raw.get('fsLayers', self._raw.get('layers', None))
 
+    @property
+    def config(self):
+        config = self._raw.get('config', None)
+        return config.get('digest', None) if config else None
+
     @property
     def history(self):
         try:
             if self._history is None:
                 raw = self._raw['history'][0]['v1Compatibility']
-                self._history = json.loads(raw)
+                self._history = codec.loads(raw)
             return self._history
         except Exception:
             return {}
@@ -354,3 +1332,10 @@ class Manifest:
 
 class RegistryError(Exception):
     pass
+
+
+class CircuitOpenError(RegistryError):
+    def __init__(self, host):
+        super().__init__('El `registry` "{}" no responde, se suspendieron '
+                         'los requests temporalmente.'.format(host))
+        self.host = host
@@ -0,0 +1,176 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/11
+# ~
+
+"""
+Motor de `release`: promueve un `tag` origen sobre un `tag` destino para un
+conjunto de repositorios de forma concurrente y transaccional.
+
+Antes de promover se resuelven en un único lote los `digests` de origen,
+destino y `rollback` (plan), sólo se escriben los `tags` que difieren. Si
+alguna promoción falla, todos los `tags` escritos (destinos y `rollback`)
+se restauran a su `digest` previo, los que no existían se eliminan.
+"""
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from aysa.registry import JOBS, to_int
+
+ROLLBACK_SUFFIX = '-rollback'
+
+log = logging.getLogger(__name__)
+
+
+class ReleaseTarget:
+    def __init__(self, repository, source, target, digest=None,
+                 previous=None, rollback_digest=None):
+        self.repository = repository
+        self.source = source
+        self.target = target
+        self.digest = digest
+        self.previous = previous
+        self.rollback_digest = rollback_digest
+        self.promoted = False
+        self.rollback_written = False
+        self.restored = False
+        self.elapsed = None
+        self.error = None
+
+    @property
+    def rollback(self):
+        return '{}{}'.format(self.target, ROLLBACK_SUFFIX)
+
+    @property
+    def changed(self):
+        return self.digest is not None and self.digest != self.previous
+
+    @property
+    def rollback_changed(self):
+        return self.previous is not None \
+            and self.previous != self.rollback_digest
+
+    def __repr__(self):
+        return '<{} Repository="{}" Source="{}" Target="{}">'\
+               .format(self.__class__.__name__, self.repository,
+                       self.source, self.target)
+
+
+class Release:
+    def __init__(self, api, source_tag, target_tag, jobs=JOBS, logger=None):
+        self.api = api
+        self.source_tag = source_tag
+        self.target_tag = target_tag
+        self.jobs = max(1, to_int(jobs, JOBS))
+        self.logger = logger or log
+        self.targets = []
+        self.elapsed = None
+
+    def plan(self, repositories):
+        self.targets = [ReleaseTarget(x, self.source_tag, self.target_tag)
+                        for x in repositories]
+        pairs = []
+        for x in self.targets:
+            pairs.extend([(x.repository, x.source),
+                          (x.repository, x.target),
+                          (x.repository, x.rollback)])
+        digests = self.api.digests(pairs, self.jobs)
+        for x in self.targets:
+            x.digest = digests[(x.repository, x.source)]
+            x.previous = digests[(x.repository, x.target)]
+            x.rollback_digest = digests[(x.repository, x.rollback)]
+        return self.targets
+
+    @property
+    def changes(self):
+        return [x for x in self.targets if x.changed]
+
+    def run(self, repositories=None):
+        if repositories is not None:
+            self.plan(repositories)
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(self.jobs) as executor:
+                futures = [executor.submit(self._promote, x)
+                           for x in self.changes]
+                _, pending = wait(futures, return_when=FIRST_EXCEPTION)
+                for x in pending:
+                    x.cancel()
+            failed = [x for x in self.targets if x.error is not None]
+            if failed:
+                self._restore()
+                raise ReleaseError(failed)
+        finally:
+            self.elapsed = time.perf_counter() - started
+        return self.targets
+
+    @property
+    def promoted(self):
+        return [x for x in self.targets if x.promoted]
+
+    @property
+    def throughput(self):
+        if not self.elapsed:
+            return 0.0
+        return len(self.promoted) / self.elapsed
+
+    def _promote(self, target):
+        started = time.perf_counter()
+        try:
+            if target.rollback_changed:
+                target.rollback_written = True
+                self.api.put_tag(target.repository, target.previous,
+                                 target.rollback)
+                self.logger.info('release source: %s, target: %s',
+                                 target.target, target.rollback)
+            self.api.put_tag(target.repository, target.digest or target.source,
+                             target.target)
+            target.promoted = True
+            self.logger.info('release source: %s, target: %s',
+                             target.source, target.target)
+        except Exception as e:
+            target.error = e
+            self.logger.error('Release imagen "%s:%s": %s',
+                              target.repository, target.source, e)
+            raise
+        finally:
+            target.elapsed = time.perf_counter() - started
+
+    def _restore(self):
+        targets = [x for x in self.targets
+                   if x.promoted or x.rollback_written]
+        with ThreadPoolExecutor(self.jobs) as executor:
+            for x in targets:
+                executor.submit(self._restore_target, x)
+
+    def _restore_target(self, target):
+        restored = True
+        if target.promoted:
+            restored &= self._restore_tag(target, target.target,
+                                          target.previous)
+        if target.rollback_written:
+            restored &= self._restore_tag(target, target.rollback,
+                                          target.rollback_digest)
+        target.restored = restored
+
+    def _restore_tag(self, target, tag, digest):
+        try:
+            if digest is None:
+                self.api.untag(target.repository, tag)
+            else:
+                self.api.put_tag(target.repository, digest, tag)
+            self.logger.info('release restore: %s:%s, digest: %s',
+                             target.repository, tag, digest)
+            return True
+        except Exception as e:
+            self.logger.error('Restaurar imagen "%s:%s": %s',
+                              target.repository, tag, e)
+            return False
+
+
+class ReleaseError(Exception):
+    def __init__(self, targets):
+        super().__init__('Falló la promoción de {} imagen(es): {}'.format(
+            len(targets), ', '.join(x.repository for x in targets)))
+        self.targets = targets
@@ -0,0 +1,190 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/20
+# ~
+
+"""
+Políticas de retención para la limpieza masiva de `tags` (`registry gc`).
+
+Un `tag` se elimina cuando no está protegido (`dev`, `rc`, `latest` y sus
+`-rollback`) y cumple todos los criterios definidos: no se encuentra entre
+los `keep` más recientes del repositorio, coincide con `pattern` y es más
+antiguo que `older_than` días.
+
+Eliminar un manifiesto elimina todos los `tags` que apuntan a él, por lo
+tanto las eliminaciones se agrupan por `digest` y nunca se elimina un
+`digest` referenciado por un `tag` que se conserva.
+
+Los `tags` cuya fecha de creación no se pudo obtener se conservan siempre
+y no cuentan para `keep`: su antigüedad es desconocida.
+"""
+
+import re
+import time
+import logging
+from fnmatch import fnmatchcase
+from datetime import datetime, timedelta, timezone
+from aysa.registry import JOBS, bounded_map, to_int
+from aysa.release import ROLLBACK_SUFFIX
+
+PROTECTED = ('dev', 'rc', 'latest')
+
+rx_created = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?'
+                        r'(Z|[+-]\d{2}:?\d{2})?$')
+
+log = logging.getLogger(__name__)
+
+
+def parse_created(value):
+    r = rx_created.match(value or '')
+    if r is None:
+        return None
+    date, fraction, zone = r.groups()
+    result = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S')
+    if fraction:
+        result = result.replace(microsecond=int(fraction[:6].ljust(6, '0')))
+    if zone and zone != 'Z':
+        sign = -1 if zone[0] == '-' else 1
+        hours, minutes = int(zone[1:3]), int(zone[-2:])
+        result -= sign * timedelta(hours=hours, minutes=minutes)
+    return result.replace(tzinfo=timezone.utc)
+
+
+class Policy:
+    def __init__(self, keep=None, pattern=None, older_than=None,
+                 protected=PROTECTED):
+        self.keep = to_int(keep, None)
+        self.pattern = pattern
+        self.older_than = to_int(older_than, None)
+        self.protected = tuple(protected)
+
+    @property
+    def defined(self):
+        return self.keep is not None or self.pattern is not None \
+            or self.older_than is not None
+
+    def is_protected(self, tag):
+        if tag.endswith(ROLLBACK_SUFFIX):
+            tag = tag[:-len(ROLLBACK_SUFFIX)]
+        return tag in self.protected
+
+    def match(self, tag, created, now=None):
+        if self.pattern is not None and not fnmatchcase(tag, self.pattern):
+            return False
+        if self.older_than is not None:
+            if created is None:
+                return False
+            now = now or datetime.now(timezone.utc)
+            if now - created < timedelta(days=self.older_than):
+                return False
+        return True
+
+
+class Candidate:
+    def __init__(self, repository, tag, digest=None, created=None):
+        self.repository = repository
+        self.tag = tag
+        self.digest = digest
+        self.created = created
+        self.keep = True
+        self.reason = None
+
+    def __repr__(self):
+        return '<{} Repository="{}" Tag="{}">'\
+               .format(self.__class__.__name__, self.repository, self.tag)
+
+
+class Collector:
+    def __init__(self, api, policy, jobs=JOBS, logger=None):
+        self.api = api
+        self.policy = policy
+        self.jobs = max(1, to_int(jobs, JOBS))
+        self.logger = logger or log
+        self.candidates = []
+        self.deleted = []
+        self.errors = []
+        self.elapsed = None
+
+    def plan(self, images):
+        self.candidates = [Candidate(x.repository, x.tag) for x in images]
+        digests = self.api.digests([(x.repository, x.tag)
+                                    for x in self.candidates], self.jobs)
+        for x in self.candidates:
+            x.digest = digests[(x.repository, x.tag)]
+        self.candidates = [x for x in self.candidates if x.digest is not None]
+
+        def created(item):
+            name, digest = item
+            try:
+                return item, parse_created(
+                    self.api.inspect(name, digest).created)
+            except Exception as e:
+                self.logger.error('gc created "%s@%s": %s', name, digest, e)
+                return item, None
+
+        items = {(x.repository, x.digest) for x in self.candidates}
+        dates = dict(bounded_map(created, sorted(items), self.jobs))
+        repositories = {}
+        for x in self.candidates:
+            x.created = dates[(x.repository, x.digest)]
+            repositories.setdefault(x.repository, []).append(x)
+        now = datetime.now(timezone.utc)
+        for values in repositories.values():
+            self._plan_repository(values, now)
+        return self.deletes
+
+    def _plan_repository(self, values, now):
+        oldest = datetime.min.replace(tzinfo=timezone.utc)
+        values.sort(key=lambda x: (x.created or oldest, x.tag), reverse=True)
+        newest = 0
+        for x in values:
+            if self.policy.is_protected(x.tag):
+                x.reason = 'protegido'
+                continue
+            if x.created is None:
+                x.reason = 'fecha desconocida'
+                continue
+            newest += 1
+            if self.policy.keep is not None and newest <= self.policy.keep:
+                x.reason = 'reciente'
+                continue
+            if not self.policy.match(x.tag, x.created, now):
+                x.reason = 'política'
+                continue
+            x.keep = False
+        kept = {x.digest for x in values if x.keep}
+        for x in values:
+            if not x.keep and x.digest in kept:
+                x.keep = True
+                x.reason = 'digest compartido'
+
+    @property
+    def removals(self):
+        return [x for x in self.candidates if not x.keep]
+
+    @property
+    def deletes(self):
+        return sorted({(x.repository, x.digest) for x in self.removals})
+
+    def run(self):
+        started = time.perf_counter()
+
+        def delete(item):
+            name, digest = item
+            try:
+                self.api.del_manifest(name, digest)
+                self.logger.info('gc repository: %s, digest: %s',
+                                 name, digest)
+                return item, None
+            except Exception as e:
+                self.logger.error('gc repository: %s, digest: %s: %s',
+                                  name, digest, e)
+                return item, e
+
+        for item, error in bounded_map(delete, self.deletes, self.jobs):
+            if error is None:
+                self.deleted.append(item)
+            else:
+                self.errors.append((item, error))
+        self.elapsed = time.perf_counter() - started
+        return self.deleted
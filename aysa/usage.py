@@ -0,0 +1,166 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/18
+# ~
+
+"""
+Contabilidad del almacenamiento de un `namespace` en el `registry`.
+
+Cada `tag` se resuelve a su `digest` y los manifiestos se indexan por el
+mismo (`LayerIndex`), de esta forma las capas compartidas se cuentan una
+única vez y, en ejecuciones posteriores, sólo se descargan los manifiestos
+cuyo `digest` cambió. Al guardar el índice se descartan los `digests` que
+no aparecieron en el último análisis.
+"""
+
+import os
+import threading
+from pathlib import Path
+from aysa import codec
+from aysa.cache import CACHE_PATH
+from aysa.registry import JOBS, bounded_map, to_int
+
+INDEX_FILE = 'du.json'
+UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+
+def human_size(value):
+    value = float(value or 0)
+    for unit in UNITS:
+        if value < 1024 or unit == UNITS[-1]:
+            break
+        value /= 1024
+    return '{:.1f} {}'.format(value, unit)
+
+
+def get_blobs(raw):
+    """
+    Retorna la lista `[(digest, size), ...]` de las capas y el blob de
+    configuración del manifiesto, para el `schema 1` el tamaño es `0`.
+    """
+    result = []
+    config = raw.get('config', None)
+    if config:
+        result.append((config['digest'], config.get('size', 0)))
+    for x in raw.get('layers', None) or []:
+        result.append((x['digest'], x.get('size', 0)))
+    for x in raw.get('fsLayers', None) or []:
+        result.append((x['blobSum'], 0))
+    return result
+
+
+class LayerIndex:
+    def __init__(self, path=None):
+        self.path = Path(path or CACHE_PATH).expanduser() / INDEX_FILE \
+            if path is not False else None
+        self._data = None
+        self._lock = threading.Lock()
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = {}
+            if self.path is not None and self.path.exists():
+                try:
+                    self._data = codec.loads(self.path.read_bytes())
+                except (OSError, ValueError):
+                    pass
+        return self._data
+
+    def get(self, digest):
+        return self.data.get(digest, None)
+
+    def set(self, digest, blobs):
+        with self._lock:
+            self.data[digest] = [list(x) for x in blobs]
+
+    def __contains__(self, digest):
+        return digest in self.data
+
+    def prune(self, digests):
+        """
+        Conserva únicamente los `digests` indicados.
+        """
+        with self._lock:
+            self._data = {k: v for k, v in self.data.items() if k in digests}
+
+    def save(self):
+        if self.path is None or self._data is None:
+            return
+        tmp = self.path.with_name('{}.{}.{}'.format(
+            self.path.name, os.getpid(), threading.get_ident()))
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(codec.dumpb(self._data))
+            os.replace(str(tmp), str(self.path))
+        except OSError:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+
+
+class UsageEntry:
+    def __init__(self, name):
+        self.name = name
+        self.total = 0
+        self.unique = 0
+        self.shared = 0
+
+    def add(self, size, unique):
+        self.total += size
+        if unique:
+            self.unique += size
+        else:
+            self.shared += size
+
+
+class Usage:
+    def __init__(self, api, jobs=JOBS, index=None):
+        self.api = api
+        self.jobs = max(1, to_int(jobs, JOBS))
+        self.index = index if index is not None else LayerIndex()
+        self.digests = {}
+        self.fetched = 0
+
+    def scan(self, images):
+        pairs = [(x.repository, x.tag) for x in images]
+        self.digests = self.api.digests(pairs, self.jobs)
+        missing = {}
+        for (name, _), digest in self.digests.items():
+            if digest is not None and digest not in self.index:
+                missing.setdefault(digest, name)
+
+        def fetch(item):
+            digest, name = item
+            return digest, get_blobs(self.api.manifest(name, digest))
+
+        for digest, blobs in bounded_map(fetch, missing.items(), self.jobs):
+            self.index.set(digest, blobs)
+        self.fetched = len(missing)
+        self.index.prune(set(self.digests.values()))
+        self.index.save()
+        return self.report()
+
+    def report(self):
+        """
+        Retorna `(repositories, tags, total)`, donde `repositories` y `tags`
+        son diccionarios de `UsageEntry` y `total` es la suma de los blobs
+        únicos del `namespace`.
+        """
+        sizes, owners, users = {}, {}, {}
+        for (name, tag), digest in self.digests.items():
+            for blob, size in self.index.get(digest) or []:
+                sizes[blob] = size
+                owners.setdefault(blob, set()).add(name)
+                users.setdefault(blob, set()).add((name, tag))
+        repositories, tags = {}, {}
+        for (name, tag), digest in sorted(self.digests.items()):
+            repositories.setdefault(name, UsageEntry(name))
+            entry = tags[(name, tag)] = UsageEntry(tag)
+            for blob, size in self.index.get(digest) or []:
+                entry.add(size, len(users[blob]) == 1)
+        for blob, names in owners.items():
+            for name in names:
+                repositories[name].add(sizes[blob], len(names) == 1)
+        return repositories, tags, sum(sizes.values())
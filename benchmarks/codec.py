@@ -0,0 +1,93 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/15
+# ~
+
+"""
+Benchmark del codec JSON (`aysa.codec`) contra la librería estándar sobre
+un catálogo y un conjunto de manifiestos `schema 1` (con `v1Compatibility`).
+
+Usage:
+    PYTHONPATH=. python benchmarks/codec.py [REPOSITORIES] [MANIFESTS]
+"""
+
+import sys
+import json
+import time
+from aysa import codec
+
+
+def catalog(count):
+    return json.dumps({'repositories': ['dash/service-{:06d}'.format(i)
+                                        for i in range(count)]}).encode()
+
+
+def manifest(index, layers=12):
+    history = []
+    for i in range(layers):
+        history.append({'v1Compatibility': json.dumps({
+            'id': '{:064x}'.format(index * layers + i),
+            'created': '2019-11-15T12:00:{:02d}.000000000Z'.format(i),
+            'container_config': {
+                'Cmd': ['/bin/sh', '-c', 'echo layer {}'.format(i)],
+                'Env': ['PATH=/usr/local/bin:/usr/bin:/bin', 'LANG=C.UTF-8']
+            }
+        })})
+    return json.dumps({
+        'schemaVersion': 1,
+        'name': 'dash/service-{:06d}'.format(index),
+        'tag': 'latest',
+        'architecture': 'amd64',
+        'fsLayers': [{'blobSum': 'sha256:{:064x}'.format(i)}
+                     for i in range(layers)],
+        'history': history
+    }, indent=3).encode()
+
+
+def measure(name, func, values, rounds=3):
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for x in values:
+            func(x)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def decode_manifest(loads):
+    def wrapper(value):
+        data = loads(value)
+        for x in data['history']:
+            loads(x['v1Compatibility'])
+    return wrapper
+
+
+def main(repositories=100000, manifests=2000):
+    corpus = {
+        'catalog': [catalog(repositories)],
+        'manifests': [manifest(i) for i in range(manifests)]
+    }
+    decoded = {k: [json.loads(x) for x in v] for k, v in corpus.items()}
+    print('backend: {}'.format(codec.BACKEND))
+    print('{:<12} {:<8} {:>12} {:>12} {:>8}'
+          .format('corpus', 'op', 'json (s)', 'codec (s)', 'gain'))
+    for name, values in corpus.items():
+        rows = [
+            ('loads', values,
+             decode_manifest(json.loads) if name == 'manifests'
+             else json.loads,
+             decode_manifest(codec.loads) if name == 'manifests'
+             else codec.loads),
+            ('dumps', decoded[name],
+             lambda x: json.dumps(x).encode('utf-8'), codec.dumpb),
+        ]
+        for op, items, std, fast in rows:
+            a = measure(name, std, items)
+            b = measure(name, fast, items)
+            print('{:<12} {:<8} {:>12.4f} {:>12.4f} {:>7.1f}x'
+                  .format(name, op, a, b, a / b if b else 0))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:3]])
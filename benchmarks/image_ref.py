@@ -0,0 +1,53 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/13
+# ~
+
+"""
+Micro-benchmark: costo por referencia y memoria de `Image` vs `ImageRef`.
+
+Usage:
+    PYTHONPATH=. python benchmarks/image_ref.py [COUNT]
+"""
+
+import sys
+import time
+import tracemalloc
+from aysa.registry import Image, parse_image, parse_many
+
+TAGS = ('dev', 'rc', 'latest', 'rc-rollback', 'latest-rollback')
+
+
+def references(count):
+    repos = max(1, count // len(TAGS))
+    return ['dash/service-{:05d}:{}'.format(i, t)
+            for i in range(repos) for t in TAGS][:count]
+
+
+def measure(name, factory, values, reset=None):
+    if reset is not None:
+        reset()
+    started = time.perf_counter()
+    factory(values)
+    elapsed = time.perf_counter() - started
+    if reset is not None:
+        reset()
+    tracemalloc.start()
+    result = factory(values)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('{:<24} {:>10.3f} us/ref {:>10.1f} bytes/ref'
+          .format(name, elapsed / len(values) * 1e6, size / len(values)))
+    return result
+
+
+def main(count=50000):
+    values = references(count)
+    print('references: {}'.format(len(values)))
+    measure('Image', lambda x: [Image(y) for y in x], values)
+    measure('ImageRef (cold)', parse_many, values, parse_image.cache_clear)
+    measure('ImageRef (memoized)', parse_many, values)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,96 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/27
+# ~
+
+"""
+Benchmark de los comandos del `registry` contra el `registry` local
+(`aysa.fake.registry`): `registry ls`, `registry ls --detail`,
+`release quality` y `registry rm`, sin acceso a la red:
+
+    PYTHONPATH=. python benchmarks/registry.py 100 10000
+
+Usage:
+    registry.py [options] [SIZE...]
+
+Opciones:
+    -t number, --tags=number        Cantidad de `tags` por repositorio
+                                    [default: 10].
+    -j jobs, --jobs=jobs            Cantidad de consultas concurrentes
+                                    [default: 8].
+    -l seconds, --latency=seconds   Latencia del `registry` por request
+                                    [default: 0].
+    -c, --cache                     Activa la `cache` y el almacén de
+                                    manifiestos.
+
+El tamaño es la cantidad total de `tags`, por defecto: 100 10000 100000.
+"""
+
+import os
+import sys
+import time
+import tempfile
+from docopt import docopt
+from aysa.commands import AttrDict, Command, Printer
+from aysa.commands.registry import RegistryCommand, ReleaseCommand
+from aysa.fake.registry import FakeRegistry
+
+SIZES = (100, 10000, 100000)
+
+
+def execute(top, cls, argv):
+    command = cls(argv[0], parent=top)
+    command._output = Printer(open(os.devnull, 'w'))
+    try:
+        command.execute(argv[1], argv[2:], {})
+    except SystemExit:
+        pass
+
+
+def scenarios(fake, tags):
+    rm = ['{}:v{:05d}'.format(x, tags - 3)
+          for x in sorted(fake.repositories)] if tags > 3 else []
+    return [
+        ('ls', RegistryCommand, ['registry', 'ls']),
+        ('ls --detail', RegistryCommand, ['registry', 'ls', '--detail']),
+        ('release', ReleaseCommand, ['release', 'quality', '--yes']),
+        ('rm', RegistryCommand, ['registry', 'rm', '--yes'] + rm),
+    ]
+
+
+def run(size, tags, jobs, latency, cache):
+    tags = max(1, min(tags, size))
+    repositories = max(1, size // tags)
+    with FakeRegistry(latency=latency) as fake, \
+            tempfile.TemporaryDirectory() as path:
+        started = time.perf_counter()
+        total = fake.populate(repositories, tags)
+        print('{:>8} tags, {} repositorios, populate {:.2f}s'
+              .format(total, repositories, time.perf_counter() - started))
+        top = Command('aysa')
+        top.env = AttrDict(registry=AttrDict(fake.options(
+            jobs=jobs, cache=int(cache), store=int(cache), cache_path=path)))
+        for name, cls, argv in scenarios(fake, tags):
+            fake.reset_stats()
+            started = time.perf_counter()
+            execute(top, cls, argv)
+            elapsed = time.perf_counter() - started
+            requests = fake.total_requests
+            print('{:<12} {:>8} {:>10.3f}s {:>9} req {:>10.1f} req/s '
+                  '{:>10.1f} tags/s'.format(name, total, elapsed, requests,
+                                            requests / elapsed,
+                                            total / elapsed))
+        print()
+
+
+def main():
+    args = docopt(__doc__)
+    sizes = [int(x) for x in args['SIZE']] or SIZES
+    jobs = str(int(args['--jobs']))
+    for size in sizes:
+        run(size, int(args['--tags']), jobs, float(args['--latency']),
+            args['--cache'])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
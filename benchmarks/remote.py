@@ -0,0 +1,83 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/11/29
+# ~
+
+"""
+Benchmark de los comandos `remote` (`ls`, `ps` y `up`) sobre N hosts
+simulados (`aysa.fake.remote`), mide el tiempo total y la cantidad de
+viajes de ida y vuelta (conexiones + comandos):
+
+    PYTHONPATH=. python benchmarks/remote.py --hosts=10 --latency=0.02
+
+Usage:
+    remote.py [options]
+
+Opciones:
+    -n hosts, --hosts=hosts             Cantidad de hosts [default: 5].
+    -s number, --services=number        Servicios por host [default: 10].
+    -l seconds, --latency=seconds       Latencia por comando [default: 0.01].
+    -c seconds, --connect=seconds       Latencia de conexión [default: 0.05].
+"""
+
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from docopt import docopt
+from aysa.commands import AttrDict, Command, Printer
+from aysa.commands.remote import RemoteCommand
+from aysa.fake.remote import FakeConnection
+
+SCENARIOS = (
+    ('ls', {}),
+    ('ps', {}),
+    ('up', {'--yes': True, '--update': False, 'service': []}),
+)
+
+
+def environment(hosts, services, latency, connect):
+    env = AttrDict(registry=AttrDict(host='registry.local:5000',
+                                     credentials='user:pass'))
+    for index in range(hosts):
+        env['host-{:03d}'.format(index)] = AttrDict(
+            host='host-{:03d}.local'.format(index), port='22', user='deploy',
+            path='/data/deploy/dashboard', tag='dev', backend='local',
+            services=str(services), latency=str(latency),
+            connect_latency=str(connect))
+    return env
+
+
+def run(hosts, services, latency, connect):
+    top = Command('aysa')
+    top.env = environment(hosts, services, latency, connect)
+    stages = tuple(x for x in top.env if x != 'registry')
+    print('{} hosts, {} servicios, latencia {}s, conexión {}s'
+          .format(hosts, services, latency, connect))
+    with open(os.devnull, 'w') as devnull:
+        for name, kwargs in SCENARIOS:
+            command = RemoteCommand('remote', parent=top)
+            command._stages = stages
+            command._output = Printer(devnull)
+            kwargs = dict(kwargs, **{'--' + x: True for x in stages})
+            FakeConnection.stats.clear()
+            started = time.perf_counter()
+            with redirect_stdout(devnull):
+                getattr(command, name)(**kwargs)
+                command.on_finish()
+            elapsed = time.perf_counter() - started
+            stats = FakeConnection.stats
+            print('{:<6} {:>9.3f}s {:>6} round trips ({} conexiones, {} '
+                  'comandos) {:>8.3f}s/host'.format(
+                      name, elapsed, stats.round_trips, stats.connects,
+                      stats.commands, elapsed / hosts))
+
+
+def main():
+    args = docopt(__doc__)
+    run(int(args['--hosts']), int(args['--services']),
+        float(args['--latency']), float(args['--connect']))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
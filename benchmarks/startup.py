@@ -0,0 +1,86 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/12/02
+# ~
+
+"""
+Benchmark del tiempo de arranque de la `CLI`, ejecuta `python -X importtime`
+sobre `aysa.cli` y finaliza con error (exit 1) cuando el tiempo acumulado
+(mediana) supera el presupuesto o cuando se importa alguna dependencia
+pesada que debería diferirse hasta su uso (`requests`, `fabric`, ...):
+
+    PYTHONPATH=. python benchmarks/startup.py --budget=60
+
+Usage:
+    startup.py [options]
+
+Opciones:
+    -b ms, --budget=ms          Presupuesto en milisegundos [default: 60].
+    -r runs, --runs=runs        Cantidad de ejecuciones [default: 7].
+    -m module, --module=module  Módulo a importar [default: aysa.cli].
+    -t number, --top=number     Cantidad de módulos más costosos a
+                                listar [default: 10].
+"""
+
+import os
+import re
+import sys
+import subprocess
+from statistics import median
+from docopt import docopt
+
+DEFERRED = ('requests', 'urllib3', 'fabric', 'invoke', 'paramiko',
+            'cryptography', 'aiohttp', 'aysa.registry', 'aysa.daemon')
+
+rx_line = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def importtime(module):
+    """
+    Retorna `{module: (self_us, cumulative_us)}` de una ejecución.
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import {}'.format(module)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+        universal_newlines=True)
+    if process.returncode != 0:
+        raise SystemExit(process.stderr)
+    result = {}
+    for line in process.stderr.splitlines():
+        r = rx_line.match(line)
+        if r is not None:
+            result[r.group(4)] = (int(r.group(1)), int(r.group(2)))
+    return result
+
+
+def main():
+    args = docopt(__doc__)
+    module = args['--module']
+    budget = float(args['--budget'])
+    runs = [importtime(module) for _ in range(max(1, int(args['--runs'])))]
+    elapsed = median(x[module][1] for x in runs) / 1000.0
+    last = runs[-1]
+
+    print('{}: {:.1f}ms (mediana de {} ejecuciones), presupuesto {:.1f}ms'
+          .format(module, elapsed, len(runs), budget))
+    top = sorted(last.items(), key=lambda x: x[1][0], reverse=True)
+    for name, (own, cumulative) in top[:int(args['--top'])]:
+        print('  {:<40} {:>8.1f}ms {:>8.1f}ms'
+              .format(name, own / 1000.0, cumulative / 1000.0))
+
+    failed = False
+    deferred = [x for x in DEFERRED if x in last]
+    if deferred:
+        failed = True
+        print('[ERROR] importados al arrancar: {}'.format(', '.join(deferred)))
+    if elapsed > budget:
+        failed = True
+        print('[ERROR] el arranque supera el presupuesto: {:.1f}ms > {:.1f}ms'
+              .format(elapsed, budget))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -44,6 +44,10 @@ setup(
         "urllib3==1.25.6",
     ],
 
+    extras_require={
+        'async': ['aiohttp>=3.6'],
+    },
+
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Environment :: Console',
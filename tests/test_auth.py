@@ -0,0 +1,99 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/12/05
+# ~
+
+import time
+import threading
+from contextlib import contextmanager
+from aysa.fake.registry import FakeRegistry
+from aysa.registry import Api, TOKEN_MARGIN
+
+NAME = 'dash/service-{:06d}'
+
+
+def exchanges(fake):
+    return len(fake.tokens)
+
+
+@contextmanager
+def client(fake, **kwargs):
+    api = Api(**fake.options(**kwargs))
+    try:
+        yield api
+    finally:
+        api.close()
+
+
+def test_challenge_then_token():
+    with FakeRegistry(auth=True) as fake:
+        fake.populate(repositories=2, tags=3)
+        with client(fake) as api:
+            assert list(api.catalog()) == [NAME.format(0), NAME.format(1)]
+        assert exchanges(fake) == 1
+        assert fake.requests['GET'] == 3
+
+
+def test_tokens_are_reused_per_scope():
+    with FakeRegistry(auth=True) as fake:
+        fake.populate(repositories=2, tags=3)
+        with client(fake) as api:
+            for _ in range(3):
+                list(api.tags(NAME.format(0)))
+            assert exchanges(fake) == 1
+            list(api.tags(NAME.format(1)))
+            assert exchanges(fake) == 2
+            list(api.catalog())
+            assert exchanges(fake) == 3
+            list(api.tags(NAME.format(1)))
+            assert exchanges(fake) == 3
+
+
+def test_expired_tokens_are_renewed(monkeypatch):
+    expires = TOKEN_MARGIN + 10
+    with FakeRegistry(auth=True, token_expires=expires) as fake:
+        fake.populate(repositories=1, tags=3)
+        with client(fake) as api:
+            list(api.tags(NAME.format(0)))
+            list(api.tags(NAME.format(0)))
+            assert exchanges(fake) == 1
+            now = time.time() + expires - TOKEN_MARGIN
+            monkeypatch.setattr(time, 'time', lambda: now)
+            list(api.tags(NAME.format(0)))
+        assert exchanges(fake) == 2
+
+
+def test_rejected_tokens_are_renewed():
+    with FakeRegistry(auth=True) as fake:
+        fake.populate(repositories=1, tags=3)
+        with client(fake) as api:
+            list(api.tags(NAME.format(0)))
+            fake.tokens.clear()
+            assert list(api.tags(NAME.format(0)))
+            list(api.tags(NAME.format(0)))
+        assert exchanges(fake) == 1
+        assert fake.requests['GET'] == 7
+
+
+def test_concurrent_workers_share_a_single_exchange():
+    workers = 8
+    with FakeRegistry(auth=True, latency=0.01) as fake:
+        fake.populate(repositories=1, tags=workers)
+        with client(fake, jobs=workers) as api:
+            name = NAME.format(0)
+            tags = sorted(fake.repositories[name])
+            barrier = threading.Barrier(workers)
+            results = {}
+
+            def worker(tag):
+                barrier.wait()
+                results[tag] = api.digest(name, tag)
+
+            threads = [threading.Thread(target=worker, args=(x,))
+                       for x in tags]
+            for x in threads:
+                x.start()
+            for x in threads:
+                x.join()
+        assert exchanges(fake) == 1
+        assert all(results[x] == fake.resolve(name, x) for x in tags)
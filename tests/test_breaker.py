@@ -0,0 +1,93 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/12/05
+# ~
+
+import pytest
+from aysa.fake.registry import FakeRegistry
+from aysa.registry import Api, CircuitBreaker
+
+
+def trip(breaker, results):
+    tickets = [breaker.allow() for _ in results]
+    for success, ticket in zip(results, tickets):
+        breaker.record(success, ticket)
+    return tickets
+
+
+def test_opens_on_failure_ratio():
+    breaker = CircuitBreaker(window=4, ratio=0.5, cooldown=60)
+    trip(breaker, [False, False, False, True])
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_late_results_do_not_close_the_circuit():
+    breaker = CircuitBreaker(window=4, ratio=0.5, cooldown=60)
+    late = breaker.allow()
+    trip(breaker, [False, False, False, True])
+    breaker.record(True, late)
+    breaker.record(True)
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_only_the_probe_decides():
+    breaker = CircuitBreaker(window=2, ratio=0.5, cooldown=0)
+    late = breaker.allow()
+    trip(breaker, [False, False])
+    assert breaker.state == 'half-open'
+    probe = breaker.allow()
+    assert probe
+    assert not breaker.allow()
+    breaker.record(False, late)
+    assert not breaker.allow()
+    breaker.record(True, probe)
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(window=2, ratio=0.5, cooldown=0)
+    trip(breaker, [False, False])
+    probe = breaker.allow()
+    breaker.record(False, probe)
+    assert breaker._opened is not None
+    probe = breaker.allow()
+    assert probe
+    breaker.record(True, probe)
+    assert breaker.state == 'closed'
+
+
+def test_interrupted_probe_is_released():
+    breaker = CircuitBreaker(window=2, ratio=0.5, cooldown=0)
+    trip(breaker, [False, False])
+    probe = breaker.allow()
+    assert not breaker.allow()
+    breaker.record(None, probe)
+    assert breaker.state == 'half-open'
+    probe = breaker.allow()
+    assert probe
+    breaker.record(True, probe)
+    assert breaker.state == 'closed'
+
+
+def test_interrupted_request_keeps_the_interrupt():
+    with FakeRegistry() as fake:
+        fake.populate(repositories=1, tags=1)
+        api = Api(**fake.options())
+        breaker = api.registry.breaker = CircuitBreaker(window=1, ratio=1,
+                                                        cooldown=0)
+        breaker.record(False, breaker.allow())
+        request = api.registry.client.request
+
+        def interrupted(*args, **kwargs):
+            raise KeyboardInterrupt()
+
+        api.registry.client.request = interrupted
+        with pytest.raises(KeyboardInterrupt):
+            list(api.catalog())
+        api.registry.client.request = request
+        assert list(api.catalog()) == ['dash/service-000000']
+        assert breaker.state == 'closed'
+        api.close()
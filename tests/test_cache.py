@@ -0,0 +1,78 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/12/05
+# ~
+
+import os
+from datetime import datetime, timedelta
+from aysa.cache import HttpCache, build_response
+from aysa.fake.registry import FakeRegistry
+from aysa.registry import Api
+
+NAME = 'dash/service-000000'
+
+
+def test_put_tag_revalidates_the_cached_source(tmp_path):
+    with FakeRegistry() as fake:
+        fake.populate(repositories=1, tags=3)
+        options = fake.options(cache=1, store=0, cache_path=str(tmp_path))
+        api = Api(**options)
+        stale, _, _ = api.raw_manifest(NAME, 'dev')
+        api.close()
+
+        fresh = fake.add_image(NAME, 'dev',
+                               datetime.utcnow() + timedelta(days=1))
+        assert fresh != stale
+
+        api = Api(**options)
+        assert api.raw_manifest(NAME, 'dev')[0] == stale
+        api.put_tag(NAME, 'dev', 'hotfix')
+        api.close()
+        assert fake.resolve(NAME, 'hotfix') == fresh
+
+
+def test_store_skips_head_for_unknown_tags(tmp_path):
+    with FakeRegistry() as fake:
+        fake.populate(repositories=1, tags=5)
+        options = fake.options(cache=0, store=1, cache_path=str(tmp_path))
+        tags = sorted(fake.repositories[NAME])
+
+        api = Api(**options)
+        for x in tags:
+            assert api.raw_manifest(NAME, x)[0] == fake.resolve(NAME, x)
+        api.close()
+        assert fake.requests == {'GET': len(tags)}
+
+        fake.reset_stats()
+        fresh = fake.add_image(NAME, 'dev',
+                               datetime.utcnow() + timedelta(days=1))
+        api = Api(**options)
+        for x in tags:
+            assert api.raw_manifest(NAME, x)[0] == fake.resolve(NAME, x)
+        api.close()
+        assert fake.requests == {'HEAD': len(tags), 'GET': 1}
+        assert api.store.get_ref(NAME, 'dev') == fresh
+
+
+def test_http_cache_evicts_whole_entries_by_last_access(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    keys = [cache.key('http://fake/v2/{}/tags/list'.format(NAME),
+                      {'n': x}) for x in range(4)]
+    for i, x in enumerate(keys[:3]):
+        cache.set(x, build_response({'status': 200, 'url': x[1],
+                                     'headers': {}}, b'x' * 1000))
+        for y in cache._files(x):
+            os.utime(str(y), (i, i))
+    sizes = [sum(y.stat().st_size for y in cache._files(x))
+             for x in keys[:3]]
+    assert cache._size == sum(sizes)
+
+    assert cache.get(keys[0]) is not None
+    cache.max_size = sum(sizes) + sizes[0] // 2
+    cache.set(keys[3], build_response({'status': 200, 'url': keys[3][1],
+                                       'headers': {}}, b'x' * 1000))
+    assert [all(y.exists() for y in cache._files(x)) for x in keys] == \
+        [True, False, True, True]
+    assert not any(x.exists() for x in cache._files(keys[1]))
+    assert cache._size == sum(y.stat().st_size for x in keys
+                              for y in cache._files(x) if y.exists())
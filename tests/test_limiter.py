@@ -0,0 +1,32 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/12/05
+# ~
+
+from aysa.registry import RateLimiter, get_rate_limiter
+
+
+def test_writes_share_the_read_budget():
+    limiter = RateLimiter(max_inflight=2)
+    assert limiter.write is limiter.read
+    assert limiter.budget('GET').enter(False)
+    assert limiter.budget('GET').enter(False)
+    assert not limiter.budget('PUT').enter(False)
+    limiter.release('GET')
+    assert limiter.budget('PUT').enter(False)
+
+
+def test_write_limits_define_their_own_budget():
+    limiter = RateLimiter(max_inflight=2, max_write_inflight=1)
+    assert limiter.write is not limiter.read
+    assert limiter.budget('DELETE').enter(False)
+    assert not limiter.budget('PUT').enter(False)
+    assert limiter.budget('GET').enter(False)
+
+
+def test_limiter_is_rebuilt_when_settings_change():
+    first = get_rate_limiter('limiter.test', max_rps='10')
+    assert get_rate_limiter('limiter.test', max_rps=10) is first
+    second = get_rate_limiter('limiter.test', max_rps='5', max_inflight='2')
+    assert second is not first
+    assert second.read.rps == 5 and second.read.inflight == 2
@@ -0,0 +1,36 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/12/06
+# ~
+
+from aysa.fake.registry import FakeRegistry
+from aysa.registry import Api
+
+NAME = 'dash/service-000000'
+
+
+def stats(fake, **kwargs):
+    api = Api(**fake.options(**kwargs))
+    for x in sorted(fake.repositories[NAME]):
+        api.digest(NAME, x)
+    value = api.stats()
+    api.close()
+    return value
+
+
+def test_stats_count_reused_connections():
+    with FakeRegistry() as fake:
+        fake.populate(repositories=1, tags=5)
+        value = stats(fake)
+    assert value['requests'] == 5
+    assert value['connections'] == 1
+    assert value['reused'] == 4
+
+
+def test_stats_count_reconnections():
+    with FakeRegistry() as fake:
+        fake.populate(repositories=1, tags=5)
+        value = stats(fake, keep_alive=False)
+    assert value['requests'] == 5
+    assert value['connections'] >= 5
+    assert value['reused'] == 0
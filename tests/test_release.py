@@ -0,0 +1,60 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/12/06
+# ~
+
+import pytest
+from aysa.fake.registry import FakeRegistry
+from aysa.registry import Api, RegistryError
+from aysa.release import Release, ReleaseError
+
+NAMES = ['dash/service-{:06d}'.format(x) for x in range(3)]
+
+
+@pytest.fixture
+def fake():
+    with FakeRegistry() as value:
+        value.populate(repositories=3, tags=5)
+        yield value
+
+
+@pytest.fixture
+def api(fake):
+    value = Api(**fake.options())
+    yield value
+    value.close()
+
+
+def test_release(api, fake):
+    release = Release(api, 'rc', 'latest', jobs=2)
+    release.run(NAMES)
+    assert len(release.promoted) == 3
+    for x in NAMES:
+        tags = fake.repositories[x]
+        assert tags['latest'] == tags['rc']
+        assert tags['latest-rollback'] != tags['rc']
+
+
+def test_failed_release_is_restored(api, fake):
+    # service-000000: sin `latest-rollback`.
+    # service-000001: sin `latest`.
+    # service-000002: `latest-rollback` previo, falla al escribir `latest`.
+    fake.repositories[NAMES[1]].pop('latest')
+    api.put_tag(NAMES[2], 'v00001', 'latest-rollback')
+    expected = {x: dict(fake.repositories[x]) for x in NAMES}
+    put_tag = api.put_tag
+
+    def failing_put_tag(name, reference, target):
+        if (name, target) == (NAMES[2], 'latest'):
+            api.put_tag = put_tag
+            raise RegistryError('falla inyectada')
+        return put_tag(name, reference, target)
+
+    api.put_tag = failing_put_tag
+    release = Release(api, 'rc', 'latest', jobs=1)
+    with pytest.raises(ReleaseError):
+        release.run(NAMES)
+    assert [x.promoted for x in release.targets] == [True, True, False]
+    assert all(x.restored for x in release.targets)
+    for x in NAMES:
+        assert fake.repositories[x] == expected[x]
@@ -0,0 +1,80 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/12/06
+# ~
+
+import pytest
+from aysa.fake.registry import FakeRegistry
+from aysa.registry import Api, RegistryError, parse_image
+from aysa.retention import Collector, Policy
+
+NAME = 'dash/service-000000'
+
+
+@pytest.fixture
+def fake():
+    with FakeRegistry() as value:
+        value.populate(repositories=1, tags=8)
+        yield value
+
+
+@pytest.fixture
+def api(fake):
+    value = Api(**fake.options())
+    yield value
+    value.close()
+
+
+def plan(api, fake, **kwargs):
+    collector = Collector(api, Policy(**kwargs), jobs=4)
+    collector.plan([parse_image('{}:{}'.format(NAME, x))
+                    for x in sorted(fake.repositories[NAME])])
+    return collector, {x.tag: x for x in collector.candidates}
+
+
+def test_keep_newest(api, fake):
+    collector, tags = plan(api, fake, keep=2)
+    assert tags['v00001'].reason == tags['v00002'].reason == 'reciente'
+    assert sorted(x.tag for x in collector.removals) == \
+        ['v00003', 'v00004', 'v00005']
+    collector.run()
+    assert not collector.errors
+    assert sorted(fake.repositories[NAME]) == \
+        ['dev', 'latest', 'rc', 'v00001', 'v00002']
+
+
+def test_protected_tags(api, fake):
+    api.put_tag(NAME, 'v00005', 'latest-rollback')
+    collector, tags = plan(api, fake, pattern='*')
+    for x in ('dev', 'rc', 'latest', 'latest-rollback'):
+        assert tags[x].keep and tags[x].reason == 'protegido'
+    assert tags['v00005'].keep
+    assert tags['v00005'].reason == 'digest compartido'
+    assert sorted(x.tag for x in collector.removals) == \
+        ['v00001', 'v00002', 'v00003', 'v00004']
+
+
+def test_shared_digest(api, fake):
+    api.put_tag(NAME, 'v00001', 'v00005-alias')
+    collector, tags = plan(api, fake, keep=1)
+    assert tags['v00005-alias'].reason == 'reciente'
+    assert tags['v00001'].keep
+    assert tags['v00001'].reason == 'digest compartido'
+    assert (NAME, fake.resolve(NAME, 'v00001')) not in collector.deletes
+
+
+def test_unknown_created_is_kept(api, fake, monkeypatch):
+    failed = fake.resolve(NAME, 'v00001')
+    inspect = api.inspect
+
+    def broken(name, reference, **kwargs):
+        if reference == failed:
+            raise RegistryError('UNAVAILABLE: service unavailable')
+        return inspect(name, reference, **kwargs)
+
+    monkeypatch.setattr(api, 'inspect', broken)
+    collector, tags = plan(api, fake, keep=2)
+    assert tags['v00001'].keep
+    assert tags['v00001'].reason == 'fecha desconocida'
+    assert tags['v00002'].reason == tags['v00003'].reason == 'reciente'
+    assert sorted(x.tag for x in collector.removals) == ['v00004', 'v00005']
@@ -0,0 +1,45 @@
+# Author: Alejandro M. Bernardis
+# Email: alejandro.bernardis at gmail.com
+# Created: 2019/12/06
+# ~
+
+from aysa import codec
+from aysa.fake.registry import FakeRegistry
+from aysa.registry import Api, parse_image
+from aysa.usage import INDEX_FILE, LayerIndex, Usage
+
+NAME = 'dash/service-000000'
+
+
+def scan(fake, index):
+    api = Api(**fake.options())
+    usage = Usage(api, 4, index)
+    usage.scan([parse_image('{}:{}'.format(NAME, x))
+                for x in sorted(fake.repositories[NAME])])
+    api.close()
+    return usage
+
+
+def test_index_is_reused_and_pruned(tmp_path):
+    with FakeRegistry() as fake:
+        fake.populate(repositories=1, tags=4)
+        digests = set(fake.repositories[NAME].values())
+        usage = scan(fake, LayerIndex(str(tmp_path)))
+        assert usage.fetched == len(digests)
+        assert set(codec.loads((tmp_path / INDEX_FILE).read_bytes())) == \
+            digests
+
+        fake.delete(NAME, fake.repositories[NAME].pop('v00001'))
+        usage = scan(fake, LayerIndex(str(tmp_path)))
+        assert usage.fetched == 0
+        assert set(codec.loads((tmp_path / INDEX_FILE).read_bytes())) == \
+            set(fake.repositories[NAME].values())
+        assert [x.name for x in tmp_path.iterdir()] == [INDEX_FILE]
+
+
+def test_index_disabled():
+    with FakeRegistry() as fake:
+        fake.populate(repositories=1, tags=4)
+        index = LayerIndex(False)
+        assert scan(fake, index).fetched == 4
+        assert index.path is None